@@ -3,8 +3,17 @@
 微信公众号 MCP 服务器入口文件 (FastMCP 2.0 版本)
 支持多种传输模式：stdio、http、sse
 """
-import logging
 import os
+
+# 仅运行微信消息服务器时可启用gevent协程模式：须在其他模块导入前对标准库打补丁，
+# Web服务器检测到socket已被patch后会改用gevent WSGIServer，单线程即可处理大量并发连接。
+# MCP服务器基于asyncio，与monkey patch不兼容，因此启用MCP时忽略该配置
+if (os.getenv('WECHAT_MSG_SERVER_GEVENT', 'false').strip().lower() == 'true'
+        and os.getenv('MCP_ENABLE', 'true').strip().lower() != 'true'):
+    from gevent import monkey
+    monkey.patch_all()
+
+import logging
 import sys
 from pathlib import Path
 
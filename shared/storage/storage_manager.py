@@ -10,12 +10,33 @@ from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
 
+from shared.utils.event_loop import run_coroutine
+
 # 加载环境变量
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
+def _run_async(coro):
+    """
+    执行异步任务：当前线程有运行中的事件循环时作为任务加入该循环，不阻塞；
+    否则提交到后台常驻事件循环并等待完成
+    
+    Args:
+        coro: 协程对象
+    """
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is not None:
+        running_loop.create_task(coro)
+        return
+    
+    run_coroutine(coro)
+
+
 class StorageManager:
     """存储管理器 - 支持本地存储和S3兼容存储"""
     
@@ -46,6 +67,8 @@ class StorageManager:
             'wechat_messages': [],  # 微信消息列表
             'user_verification_codes': []  # 用户验证码列表
         }
+        # 内存中数据对应的数据文件版本 (st_mtime_ns, st_size)，文件未变化时跳过重新解析
+        self._data_file_version: Optional[Tuple[int, int]] = None
         
         # 初始化S3相关配置
         self._init_s3_config()
@@ -142,11 +165,8 @@ class StorageManager:
             
             # 定义同步任务的包装函数，将异步函数转换为同步函数
             def sync_from_remote_wrapper():
-                # 创建新的事件循环并运行异步任务
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(self.sync_from_remote())
-                loop.close()
+                # 在后台事件循环中运行异步任务
+                _run_async(self.sync_from_remote())
             
             # 添加定时任务
             self.scheduler.add_job(
@@ -163,12 +183,35 @@ class StorageManager:
         except Exception as e:
             logger.error(f"启动定时同步任务失败: {e}")
     
-    def _load_data(self):
-        """加载数据"""
+    def _get_data_file_version(self) -> Optional[Tuple[int, int]]:
+        """
+        获取数据文件版本
+        
+        Returns:
+            (st_mtime_ns, st_size)，文件不存在时返回None
+        """
+        try:
+            st = os.stat(self.db_file)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+    
+    def _load_data(self, force: bool = False):
+        """
+        加载数据，数据文件自上次加载/保存后未变化时直接使用内存中的数据
+        
+        Args:
+            force: 是否强制重新解析数据文件
+        """
+        file_version = self._get_data_file_version()
+        if not force and file_version is not None and file_version == self._data_file_version:
+            return
+        
         db_dir = Path(self.db_file).parent
         db_dir.mkdir(parents=True, exist_ok=True)
         
-        if os.path.exists(self.db_file):
+        self._data_file_version = None
+        if file_version is not None:
             try:
                 with open(self.db_file, 'r', encoding='utf-8') as f:
                     self.data = json.load(f)
@@ -180,6 +223,7 @@ class StorageManager:
                     self.data['wechat_messages'] = []
                 if 'user_verification_codes' not in self.data:
                     self.data['user_verification_codes'] = []
+                self._data_file_version = file_version
             except Exception as e:
                 logger.error(f"加载存储数据失败: {e}")
                 self.data = {'media': [], 'static_pages': []}
@@ -196,6 +240,8 @@ class StorageManager:
         try:
             with open(self.db_file, 'w', encoding='utf-8') as f:
                 json.dump(self.data, f, ensure_ascii=False, indent=2)
+            # 内存数据与刚写入的文件一致，记录版本以便后续读取跳过解析
+            self._data_file_version = self._get_data_file_version()
             
             # 如果启用了远程存储且允许写入，将数据文件同步到S3
             if self.remote_enabled and self.s3_client and self.s3_write_enabled:
@@ -203,27 +249,14 @@ class StorageManager:
                 async def upload_data_file():
                     await self._upload_to_s3(self.db_file, self._get_s3_key(self.db_file))
                 
-                try:
-                    # 检查当前线程是否已经有一个运行中的事件循环
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        # 如果已经有运行中的事件循环，使用create_task将异步任务添加到现有循环中
-                        loop.create_task(upload_data_file())
-                    else:
-                        # 如果没有运行中的事件循环，创建新的事件循环并运行
-                        loop.run_until_complete(upload_data_file())
-                except RuntimeError:
-                    # 如果获取事件循环失败，创建新的事件循环
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        loop.run_until_complete(upload_data_file())
-                    finally:
-                        loop.close()
+                # 有运行中的事件循环时加入该循环，否则在后台事件循环中执行
+                _run_async(upload_data_file())
             elif self.remote_enabled and not self.s3_write_enabled:
                 logger.debug("S3写入功能已禁用，跳过文件上传")
         except Exception as e:
             logger.error(f"保存存储数据失败: {e}")
+            # 保存失败时下次读取重新从文件加载
+            self._data_file_version = None
     
     def _get_s3_key(self, file_path: str) -> str:
         """获取S3存储的键名"""
@@ -456,7 +489,7 @@ class StorageManager:
                         logger.info(f"从S3下载新文件: {local_file_path}")
             
             # 重新加载数据
-            self._load_data()
+            self._load_data(force=True)
             
             return {
                 'status': 'success',
@@ -724,23 +757,8 @@ class StorageManager:
                 async def upload_static_page():
                     await self._upload_to_s3(filepath, s3_key)
                 
-                try:
-                    # 检查当前线程是否已经有一个运行中的事件循环
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        # 如果已经有运行中的事件循环，使用create_task将异步任务添加到现有循环中
-                        loop.create_task(upload_static_page())
-                    else:
-                        # 如果没有运行中的事件循环，创建新的事件循环并运行
-                        loop.run_until_complete(upload_static_page())
-                except RuntimeError:
-                    # 如果获取事件循环失败，创建新的事件循环
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        loop.run_until_complete(upload_static_page())
-                    finally:
-                        loop.close()
+                # 有运行中的事件循环时加入该循环，否则在后台事件循环中执行
+                _run_async(upload_static_page())
         elif self.remote_enabled and not self.s3_write_enabled:
             logger.debug("S3写入功能已禁用，跳过静态页面文件上传")
 
@@ -808,23 +826,8 @@ class StorageManager:
                     async def delete_from_s3_async():
                         await self._delete_from_s3(s3_key)
                     
-                    try:
-                        # 检查当前线程是否已经有一个运行中的事件循环
-                        loop = asyncio.get_event_loop()
-                        if loop.is_running():
-                            # 如果已经有运行中的事件循环，使用create_task将异步任务添加到现有循环中
-                            loop.create_task(delete_from_s3_async())
-                        else:
-                            # 如果没有运行中的事件循环，创建新的事件循环并运行
-                            loop.run_until_complete(delete_from_s3_async())
-                    except RuntimeError:
-                        # 如果获取事件循环失败，创建新的事件循环
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        try:
-                            loop.run_until_complete(delete_from_s3_async())
-                        finally:
-                            loop.close()
+                    # 有运行中的事件循环时加入该循环，否则在后台事件循环中执行
+                    _run_async(delete_from_s3_async())
                 elif self.remote_enabled and not self.s3_write_enabled:
                     logger.debug("S3写入功能已禁用，跳过S3文件删除")
                 
@@ -6,14 +6,56 @@ import os
 import json
 import logging
 import asyncio
+import functools
+import importlib.util
+import threading
 from warnings import catch_warnings
 import httpx
 from typing import Dict, Any, List, Optional, AsyncGenerator
 
 from httpx._transports.base import T
 
+try:
+    # orjson解析速度明显快于标准库json，未安装时回退到json
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# 安装h2后与AI接口使用HTTP/2，多个并发请求复用同一条连接；这里只检查是否安装，不导入
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
 logger = logging.getLogger(__name__)
 
+# AI接口HTTP连接池配置：保持长连接，避免每次对话重新进行TCP+TLS握手
+AI_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=64, keepalive_expiry=60)
+
+
+async def _iter_sse_data(response: httpx.Response) -> AsyncGenerator[bytes, None]:
+    """
+    按字节增量解析SSE流，逐条产出data字段内容
+    
+    直接在字节缓冲区中查找换行，只有数据行的负载交给JSON解析，无需将每一行先解码为字符串
+    
+    Args:
+        response: httpx流式响应
+        
+    Yields:
+        去掉 'data: ' 前缀后的原始字节（不包含结束标记 [DONE]）
+    """
+    buf = bytearray()
+    async for chunk in response.aiter_bytes():
+        buf.extend(chunk)
+        while (nl := buf.find(b"\n")) != -1:
+            line = bytes(buf[:nl]).rstrip(b"\r")
+            del buf[:nl + 1]
+            if line.startswith(b"data: ") and line != b"data: [DONE]":
+                yield line[6:]
+    # 处理最后一行没有换行符的情况
+    line = bytes(buf).rstrip(b"\r")
+    if line.startswith(b"data: ") and line != b"data: [DONE]":
+        yield line[6:]
+
 
 class AIService:
     """OpenAI API 服务类"""
@@ -63,6 +105,9 @@ class AIService:
             self._load_config_from_file()
             self.__class__._config_loaded = True
         
+        # 缓存系统提示词消息，避免每次请求重复构建
+        self._build_system_msg()
+        
         # 复用HTTP客户端，减少连接建立和销毁的开销
         if not hasattr(self.__class__, '_http_client'):
             self.__class__._http_client = None
@@ -79,12 +124,22 @@ class AIService:
         """
         return bool(self.api_url and self.api_key)
     
+    def _build_system_msg(self):
+        """
+        构建并缓存系统提示词消息
+        """
+        self._system_msg = {"role": "system", "content": self.system_prompt}
+    
     def _init_http_client(self):
         """
         初始化复用的HTTP客户端
         """
         if self.__class__._http_client is None or self.__class__._http_client.is_closed:
-            self.__class__._http_client = httpx.AsyncClient(timeout=self.timeout)
+            self.__class__._http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=AI_HTTP_LIMITS,
+                http2=_HTTP2_AVAILABLE
+            )
     
     async def _close_http_client(self):
         """
@@ -111,9 +166,7 @@ class AIService:
                 return "AI服务未配置，无法提供智能回复"
             
             # 构建完整的消息列表
-            full_messages = [
-                {"role": "system", "content": self.system_prompt}
-            ] + messages
+            full_messages = [self._system_msg, *messages]
             
             # 验证消息格式
             for msg in full_messages:
@@ -162,17 +215,16 @@ class AIService:
                         # 处理流式响应
                         collected_content = []
                         
-                        async for line in response.aiter_lines():
-                            if line.startswith('data: ') and line != 'data: [DONE]':
-                                # 解析JSON数据
-                                try:
-                                    data = json.loads(line[6:])  # 去掉 'data: ' 前缀
-                                    if 'choices' in data and data['choices']:
-                                        delta = data['choices'][0].get('delta', {})
-                                        if 'content' in delta:
-                                            collected_content.append(delta['content'])
-                                except json.JSONDecodeError:
-                                    continue
+                        async for payload in _iter_sse_data(response):
+                            # 解析JSON数据
+                            try:
+                                data = _json_loads(payload)
+                                if 'choices' in data and data['choices']:
+                                    delta = data['choices'][0].get('delta', {})
+                                    if 'content' in delta:
+                                        collected_content.append(delta['content'])
+                            except json.JSONDecodeError:
+                                continue
                         
                         # 构建最终回复
                         reply_content = ''.join(collected_content)
@@ -196,7 +248,7 @@ class AIService:
                     )
                     
                     if response.status_code == 200:
-                        result = response.json()
+                        result = _json_loads(response.content)
                         if 'choices' in result and len(result['choices']) > 0:
                             content = result['choices'][0]['message']['content']
                             return content
@@ -263,9 +315,7 @@ class AIService:
             messages = conversation_history or []
             messages.append({"role": "user", "content": user_message})
             
-            full_messages = [
-                {"role": "system", "content": self.system_prompt}
-            ] + messages
+            full_messages = [self._system_msg, *messages]
             
             # 验证消息格式
             for msg in full_messages:
@@ -310,17 +360,16 @@ class AIService:
                     return
                 
                 # 处理流式响应
-                async for line in response.aiter_lines():
-                    if line.startswith('data: ') and line != 'data: [DONE]':
-                        # 解析JSON数据
-                        try:
-                            data = json.loads(line[6:])  # 去掉 'data: ' 前缀
-                            if 'choices' in data and data['choices']:
-                                delta = data['choices'][0].get('delta', {})
-                                if 'content' in delta:
-                                    yield delta['content']
-                        except json.JSONDecodeError:
-                            continue
+                async for payload in _iter_sse_data(response):
+                    # 解析JSON数据
+                    try:
+                        data = _json_loads(payload)
+                        if 'choices' in data and data['choices']:
+                            delta = data['choices'][0].get('delta', {})
+                            if 'content' in delta:
+                                yield delta['content']
+                    except json.JSONDecodeError:
+                        continue
         except httpx.RemoteProtocolError:
             # 处理连接错误，重新初始化客户端
             self._init_http_client()
@@ -389,6 +438,8 @@ class AIService:
             self.max_tokens = max_tokens
             self.temperature = temperature
             self.timeout = timeout
+            self._build_system_msg()
+            self.invalidate_config()
             
             # 保存到配置文件
             config_file = os.path.join(os.path.dirname(__file__), "..", "..", "config", "ai_config.json")
@@ -413,12 +464,10 @@ class AIService:
             logger.error("保存AI服务配置失败", exc_info=True)
             return False
     
-    def get_config_info(self) -> Dict[str, Any]:
+    @functools.cached_property
+    def _config_cache(self) -> Dict[str, Any]:
         """
-        获取当前配置信息
-        
-        Returns:
-            配置信息字典
+        缓存的配置信息字典，配置更新时需调用invalidate_config失效
         """
         return {
             "api_url": self.api_url,
@@ -430,10 +479,27 @@ class AIService:
             "timeout": self.timeout,
             "is_configured": self.is_configured()
         }
+    
+    def invalidate_config(self):
+        """
+        使缓存的配置信息失效
+        """
+        self.__dict__.pop('_config_cache', None)
+    
+    def get_config_info(self) -> Dict[str, Any]:
+        """
+        获取当前配置信息
+        
+        Returns:
+            配置信息字典（副本，可安全修改）
+        """
+        return self._config_cache.copy()
 
 
 # 全局AI服务实例
 _ai_service_instances = {}
+# 保护全局AI服务实例创建和替换的锁
+_ai_service_lock = threading.Lock()
 
 
 def get_ai_service(service_type: str = "web") -> AIService:
@@ -452,20 +518,28 @@ def get_ai_service(service_type: str = "web") -> AIService:
     """
     global _ai_service_instances
     
-    # 确保服务类型字典存在
-    if service_type not in _ai_service_instances:
-        _ai_service_instances[service_type] = {}
-    
     # 创建服务类型标识符
     service_key = f"{service_type}_0"
-    # 检查是否已存在相同配置的实例
-    if service_key not in _ai_service_instances[service_type]:
-        # 对于 wechat 服务类型，不传递参数，让 AIService 构造函数自己从环境变量读取 OPENAI_WECHAT_ 前缀的配置
-        _ai_service_instances[service_type][service_key] = AIService(
-            service_type=service_type
-        )
     
-    return _ai_service_instances[service_type][service_key]
+    # 快速路径：实例已存在时无需加锁
+    instance = _ai_service_instances.get(service_type, {}).get(service_key)
+    if instance is not None:
+        return instance
+    
+    # 双重检查加锁，避免并发请求重复创建实例
+    with _ai_service_lock:
+        # 确保服务类型字典存在
+        if service_type not in _ai_service_instances:
+            _ai_service_instances[service_type] = {}
+        
+        # 检查是否已存在相同配置的实例
+        if service_key not in _ai_service_instances[service_type]:
+            # 对于 wechat 服务类型，不传递参数，让 AIService 构造函数自己从环境变量读取 OPENAI_WECHAT_ 前缀的配置
+            _ai_service_instances[service_type][service_key] = AIService(
+                service_type=service_type
+            )
+        
+        return _ai_service_instances[service_type][service_key]
 
 def set_ai_service(service_type: str = "web", api_url: Optional[str] = None, api_key: Optional[str] = None, 
                    model: Optional[str] = None, system_prompt: Optional[str] = None) -> bool:
@@ -484,21 +558,22 @@ def set_ai_service(service_type: str = "web", api_url: Optional[str] = None, api
     """
     global _ai_service_instances
 
-    # 确保服务类型字典存在
-    if service_type not in _ai_service_instances:
-        _ai_service_instances[service_type] = {}
-    
     # 创建服务类型标识符
     #service_key = f"{service_type}_{hash((api_url, api_key, model, system_prompt))}"
     service_key = f"{service_type}_0"
     try:
-        _ai_service_instances[service_type][service_key] = AIService(
-                service_type=service_type, 
-                api_url=api_url, 
-                api_key=api_key, 
-                model=model, 
-                system_prompt=system_prompt
-        )
+        with _ai_service_lock:
+            # 确保服务类型字典存在
+            if service_type not in _ai_service_instances:
+                _ai_service_instances[service_type] = {}
+            
+            _ai_service_instances[service_type][service_key] = AIService(
+                    service_type=service_type, 
+                    api_url=api_url, 
+                    api_key=api_key, 
+                    model=model, 
+                    system_prompt=system_prompt
+            )
     except Exception as e:
         logger.error("设置AI服务失败", exc_info=True)
         return False
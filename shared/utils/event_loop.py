@@ -0,0 +1,53 @@
+"""
+后台常驻事件循环模块
+进程内同步代码需要执行的异步调用（AI接口、S3同步、工具调用等）统一提交到同一个后台事件循环，
+避免每次调用都创建、关闭事件循环，同时保证共享的异步客户端（如AIService的httpx.AsyncClient）
+始终只在一个事件循环上使用
+"""
+import asyncio
+import threading
+from typing import Optional
+
+try:
+    # uvloop基于libuv实现，作为后台事件循环时I/O调度开销明显低于标准库事件循环，Windows下不可用
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# 后台常驻事件循环，首次使用时创建
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    获取后台常驻事件循环，首次调用时创建并在守护线程中运行
+
+    安装了uvloop时使用uvloop事件循环，仅作用于该循环，不修改全局事件循环策略
+
+    Returns:
+        后台事件循环
+    """
+    global _background_loop
+    # 双重检查加锁，避免并发调用重复创建事件循环
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="background-event-loop", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
+
+
+def run_coroutine(coro, timeout: Optional[float] = None):
+    """
+    在后台常驻事件循环中执行协程并阻塞等待结果，不能在后台事件循环线程内调用
+
+    Args:
+        coro: 协程对象
+        timeout: 等待超时时间（秒），默认一直等待
+
+    Returns:
+        协程的返回值，协程抛出的异常会原样抛出
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result(timeout)
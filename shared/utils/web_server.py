@@ -6,248 +6,547 @@ import logging
 import os
 import threading
 import json
+import functools
 import hashlib
+import hmac
 import re
+import socket
+import stat
 import asyncio
+import concurrent.futures
+import queue
 import time
+import traceback
+import uuid
 import requests
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from mimetypes import guess_type
 from pathlib import Path
 from typing import Optional, Dict, List, Any, Union
 from xml.etree import ElementTree as ET
 
-from flask import Flask, request, Response
+from flask import Flask, request, Response, send_file
+from werkzeug.serving import WSGIRequestHandler
 from shared.utils.ai_service import get_ai_service, set_ai_service
+from shared.utils.event_loop import get_background_loop, run_coroutine
+from shared.storage.storage_manager import StorageManager
+
+try:
+    # orjson序列化速度明显快于标准库json，用于聊天流式响应的逐块编码，未安装时回退到json
+    import orjson
+    
+    # JSON响应体序列化，直接得到UTF-8字节
+    _dumps = orjson.dumps
+    
+    def _sse_event(obj) -> bytes:
+        """将对象编码为一条SSE事件，orjson直接输出UTF-8字节，无需再经过str"""
+        return b"data: " + orjson.dumps(obj) + b"\n\n"
+except ImportError:
+    orjson = None
+    
+    def _dumps(obj) -> bytes:
+        """将对象序列化为UTF-8编码的JSON响应体"""
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    
+    def _sse_event(obj) -> bytes:
+        """将对象编码为一条SSE事件"""
+        return f"data: {json.dumps(obj)}\n\n".encode('utf-8')
+
+try:
+    # Flask 2.2+ 支持替换JSON提供器
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = None
+
+if orjson is not None and DefaultJSONProvider is not None:
+    class _OrjsonJSONProvider(DefaultJSONProvider):
+        """request.get_json()使用orjson直接解析请求体bytes，不先解码为str；序列化沿用Flask默认实现"""
+        
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+else:
+    _OrjsonJSONProvider = None
+
+try:
+    # lxml为C实现的XML解析器，解析微信消息比标准库ElementTree更快，未安装时回退到ElementTree
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+# 协程超时上下文管理器：只注册一个call_later定时器，不像asyncio.wait_for那样额外创建Task；
+# Python 3.11+使用标准库asyncio.timeout，更早版本使用async_timeout，两者都不可用时回退到wait_for
+_async_timeout = getattr(asyncio, 'timeout', None)
+if _async_timeout is None:
+    try:
+        from async_timeout import timeout as _async_timeout
+    except ImportError:
+        _async_timeout = None
+
+
+async def _await_with_timeout(coro, timeout: float):
+    """
+    在当前任务内等待协程完成，超时时取消并抛出asyncio.TimeoutError
+    
+    Args:
+        coro: 协程对象
+        timeout: 超时时间（秒）
+        
+    Returns:
+        协程的返回值
+    """
+    if _async_timeout is None:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    async with _async_timeout(timeout):
+        return await coro
 
 logger = logging.getLogger(__name__)
 
+# 项目根目录及模板文件路径，模块加载时计算一次，请求处理时无需重复构造Path对象
+_PROJECT_ROOT = Path(__file__).parent.parent.parent
+_TEMPLATES_DIR = _PROJECT_ROOT / "templates"
+_INDEX_TEMPLATE = str(_TEMPLATES_DIR / "index_template.html")
+_CHAT_TEMPLATE = str(_TEMPLATES_DIR / "chat_template.html")
+_STATIC_PAGES_TEMPLATE = str(_TEMPLATES_DIR / "static_pages_template.html")
 
-def my_render_template(template_path: str, variables: Dict[str, Any]) -> str:
+# 静态页面浏览器缓存时间（秒）
+# 自定义文件名的页面可能被删除后以同名重新生成，因此不使用immutable，过期后通过ETag协商
+STATIC_PAGE_MAX_AGE = 3600
+
+# 静态页面预压缩版本，按优先级排列：(Content-Encoding, 文件后缀)
+PRECOMPRESSED_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# 静态页面文件stat结果缓存的有效期（秒）和最大条目数
+STAT_CACHE_TTL = 5
+STAT_CACHE_MAXSIZE = 1024
+
+# 热门静态页面内容缓存：最多缓存的页面数和单个文件大小上限（字节）
+PAGE_CONTENT_CACHE_SIZE = 64
+PAGE_CONTENT_CACHE_MAX_BYTES = 256 * 1024
+
+# 静态网页列表渲染结果缓存的最大条目数（按页面列表版本、页码和模板修改时间区分）
+PAGES_LIST_HTML_CACHE_SIZE = 16
+
+# 聊天SSE响应合并写出：缓冲达到该字节数，或距上次写出超过该时间（秒）时写出，
+# 减少逐token写出产生的大量小TCP包和系统调用，同时保证交互延迟不超过该时间
+SSE_FLUSH_BYTES = 4096
+SSE_FLUSH_INTERVAL = 0.05
+
+# 密码校验、请求数据校验等固定JSON响应体，模块加载时预先序列化，错误路径无需每次构造字典并序列化
+_INVALID_PASSWORD_BODY = _dumps({'success': False, 'message': 'Invalid password'})
+_PASSWORD_VALIDATED_BODY = _dumps({'success': True, 'message': 'Password validated'})
+_INVALID_REQUEST_DATA_BODY = _dumps({'error': '无效的请求数据'})
+
+# 微信文本消息回复XML的固定片段，按顺序与ToUserName、FromUserName、CreateTime、Content拼接
+# 与微信被动回复文档格式一致，不带XML声明和元素间换行，减少每条回复的字节数
+_WECHAT_REPLY_PREFIX = '<xml><ToUserName><![CDATA['
+_WECHAT_REPLY_FROM = ']]></ToUserName><FromUserName><![CDATA['
+_WECHAT_REPLY_TIME = ']]></FromUserName><CreateTime>'
+_WECHAT_REPLY_CONTENT = '</CreateTime><MsgType><![CDATA[text]]></MsgType><Content><![CDATA['
+_WECHAT_REPLY_SUFFIX = ']]></Content></xml>'
+
+# 网站图标浏览器缓存时间（秒），图标URL固定不带版本号，因此不使用immutable
+FAVICON_MAX_AGE = 86400
+
+# 反向代理到目标服务器的连接池大小（每个主机保持的最大连接数）
+PROXY_POOL_MAXSIZE = 32
+
+# 响应写缓冲区大小（字节）：响应头、分块传输的长度行和响应体先写入缓冲区，
+# 在每次写出响应体时合并为一次send，而不是响应头和响应体各发送一次
+RESPONSE_WRITE_BUFFER_SIZE = 64 * 1024
+
+# 静态网页列表分页HTML片段模板
+_PAGE_LINK_TMPL = "<a href='{url}?page={page}' class='page-btn{cls}'>{label}</a>"
+_PAGE_SPAN_TMPL = "<span class='page-btn{cls}'>{label}</span>"
+_PAGE_JUMP_TMPL = """
+                <div class='page-jump'>
+                    <input type='number' id='jumpPage' min='1' max='{total_pages}' placeholder='页码' class='jump-input' />
+                    <button onclick="jumpToPage({total_pages})" class='jump-btn'>跳转</button>
+                </div>
+                <script>
+                    function jumpToPage(totalPages) {{
+                        var pageNum = document.getElementById('jumpPage').value;
+                        pageNum = parseInt(pageNum);
+                        if (pageNum >= 1 && pageNum <= totalPages) {{
+                            window.location.href = '{url}?page=' + pageNum;
+                        }} else {{
+                            alert('请输入有效的页码 (1-' + totalPages + ')');
+                        }}
+                    }}
+                </script>
+                """
+
+
+def _format_file_size(size_bytes) -> str:
     """
-    简单的模板渲染引擎
+    格式化文件大小
     
     Args:
-        template_path: 模板文件路径
-        variables: 模板变量字典
+        size_bytes: 字节数
         
     Returns:
-        渲染后的HTML字符串
+        带单位的文件大小字符串，如 "1.50 KB"
+    """
+    if size_bytes == 0:
+        return "0 B"
+    units = ['B', 'KB', 'MB', 'GB']
+    unit_index = 0
+    size = float(size_bytes)
+    
+    while size >= 1024 and unit_index < len(units) - 1:
+        size /= 1024
+        unit_index += 1
+    
+    return f"{size:.2f} {units[unit_index]}"
+
+
+def _get_page_size(page: Dict[str, Any]) -> float:
+    """
+    获取页面文件大小：优先使用 current_size，否则使用 file_size，无法转换为数字时返回0
+    
+    Args:
+        page: 页面信息
+        
+    Returns:
+        文件大小（字节）
     """
+    size = page.get('current_size', page.get('file_size', 0))
+    if isinstance(size, (int, float)):
+        return size
     try:
-        with open(template_path, 'r', encoding='utf-8') as f:
-            template = f.read()
-        
-        # 处理带默认值的变量替换
-        # 正则表达式匹配 {{ variable or 'default' }} 或 {{ variable or "default" }}
-        # 注意：使用负断言确保 or 前后不是单词字符或点号，避免匹配到其他单词的一部分（如 formatted 中的 or）
-        def replace_default_var(match):
-            var_name = match.group(1).strip()
-            default_value = match.group(2).strip()
-            # 移除默认值的引号
-            if (default_value.startswith("'") and default_value.endswith("'") or \
-               (default_value.startswith('"') and default_value.endswith('"'))):
-                default_value = default_value[1:-1]
-            # 处理点表示法，支持嵌套dict和对象属性
+        return float(size)
+    except (ValueError, TypeError):
+        return 0
+
+
+# lxml解析器实例不能在线程间共享，每个线程各自创建
+_xml_parser_local = threading.local()
+
+
+def _parse_xml(data: bytes):
+    """
+    解析XML字节串，不解析外部实体、不访问网络
+    
+    Args:
+        data: XML原始字节
+        
+    Returns:
+        XML根元素
+    """
+    if lxml_etree is None:
+        return ET.fromstring(data)
+    parser = getattr(_xml_parser_local, 'parser', None)
+    if parser is None:
+        # 微信消息只读取各字段文本，丢弃元素间的空白文本节点，减少解析时创建的节点
+        parser = lxml_etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=False,
+                                      remove_blank_text=True)
+        _xml_parser_local.parser = parser
+    return lxml_etree.fromstring(data, parser)
+
+
+class NoDelayRequestHandler(WSGIRequestHandler):
+    """
+    关闭Nagle算法的请求处理器
+    
+    Werkzeug每个响应后都会关闭连接，这里只减少单个响应的延迟：设置TCP_NODELAY，
+    响应的最后一个小包无需等待对端ACK即可发出；响应经写缓冲区输出，响应头与响应体合并为一次send
+    """
+    wbufsize = RESPONSE_WRITE_BUFFER_SIZE
+    
+    def handle_expect_100(self):
+        # 写缓冲区启用后，100 Continue需要立即发出，否则客户端会一直等待后才发送请求体
+        result = super().handle_expect_100()
+        self.wfile.flush()
+        return result
+    
+    def setup(self):
+        super().setup()
+        try:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as e:
+            logger.debug("设置连接socket选项失败: %s", e)
+
+
+# 模板语法正则表达式，模块加载时预编译
+# {% for item in items %}...{% endfor %}
+_TEMPLATE_FOR_RE = re.compile(r'\{\%\s*for\s+(\w+)\s+in\s+([\w.]+)\s*\%\}(.*?)\{\%\s*endfor\s*\%\}', re.DOTALL)
+# {% if cond %}...{% else %}...{% endif %}
+_TEMPLATE_IF_ELSE_RE = re.compile(r'\{\%\s*if\s+([\w.]+)\s*\%\}(.*?)\{\%\s*else\s*\%\}(.*?)\{\%\s*endif\s*\%\}', re.DOTALL)
+# {% if cond %}...{% endif %}
+_TEMPLATE_IF_RE = re.compile(r'\{\%\s*if\s+([\w.]+)\s*\%\}(.*?)\{\%\s*endif\s*\%\}', re.DOTALL)
+# {{ variable or 'default' }}，使用负断言确保 or 前后不是单词字符或点号，避免匹配到其他单词的一部分（如 formatted 中的 or）
+_TEMPLATE_DEFAULT_VAR_RE = re.compile(r'\{\{\s*([\w.]+)\s*(?<![\w.])or(?![\w.])\s*([^}]+)\s*\}\}')
+# {{ variable }}
+_TEMPLATE_VAR_RE = re.compile(r'\{\{\s*([\w.]+)\s*\}\}')
+# 上述两种变量写法的合并模式，编译模板时一遍扫描同时识别：带默认值的变量为第1、2组，普通变量为第3组
+_TEMPLATE_ANY_VAR_RE = re.compile(f'{_TEMPLATE_DEFAULT_VAR_RE.pattern}|{_TEMPLATE_VAR_RE.pattern}')
+
+
+# 模板编译后的操作类型：模板在首次使用（或文件更新）时编译为操作列表，渲染时直接遍历，不再执行正则替换
+# (_OP_TEXT, 文本)
+_OP_TEXT = 0
+# (_OP_VAR, 变量路径元组)
+_OP_VAR = 1
+# (_OP_DEFAULT_VAR, 变量路径元组, 默认值)
+_OP_DEFAULT_VAR = 2
+# (_OP_IF, 条件变量路径元组, 条件为真时的操作, 条件为假时的操作)
+_OP_IF = 3
+# (_OP_FOR, 循环变量名, 列表变量路径元组, 循环体操作)
+_OP_FOR = 4
+
+# 编译过程中已编译块在文本中的占位符
+_TEMPLATE_PLACEHOLDER_RE = re.compile(r'\x00(\d+)\x00')
+
+
+def _resolve_template_var(context, path: tuple):
+    """
+    按预先拆分的点表示法路径从模板上下文中取值，支持嵌套dict（及其他映射类型）和对象属性
+    
+    Args:
+        context: 模板变量上下文
+        path: 变量路径元组，如 ('page', 'filename')
+        
+    Returns:
+        变量值，任一级不存在时返回None
+    """
+    value = context
+    for part in path:
+        if isinstance(value, Mapping):
+            value = value.get(part)
+        else:
+            value = getattr(value, part, None)
+        if value is None:
+            return None
+    return value
+
+
+def _strip_default_quotes(default_value: str) -> str:
+    """
+    去掉 {{ variable or 'default' }} 中默认值两侧的引号
+    
+    Args:
+        default_value: 默认值原文
+        
+    Returns:
+        去掉引号后的默认值
+    """
+    # 首尾为同一种引号时才去掉；单独一个引号字符原样保留
+    if len(default_value) >= 2 and default_value[0] == default_value[-1] and default_value[0] in ('"', "'"):
+        return default_value[1:-1]
+    return default_value
+
+
+def _compile_var_text(text: str, ops: list):
+    """
+    将不含块标签的文本编译为文本、变量操作，追加到ops
+    
+    Args:
+        text: 模板文本
+        ops: 操作列表
+    """
+    # 带默认值的变量和普通变量一遍扫描识别，同一位置优先匹配带默认值的写法
+    pos = 0
+    for match in _TEMPLATE_ANY_VAR_RE.finditer(text):
+        if match.start() > pos:
+            ops.append((_OP_TEXT, text[pos:match.start()]))
+        if match.group(1) is not None:
+            ops.append((_OP_DEFAULT_VAR, tuple(match.group(1).strip().split('.')),
+                        _strip_default_quotes(match.group(2).strip())))
+        else:
+            ops.append((_OP_VAR, tuple(match.group(3).strip().split('.'))))
+        pos = match.end()
+    if pos < len(text):
+        ops.append((_OP_TEXT, text[pos:]))
+
+
+def _compile_template_section(text: str, blocks: list, if_else: bool = True, if_plain: bool = True) -> tuple:
+    """
+    编译一段模板文本：依次识别if-else块、if块，再识别变量，识别顺序与原先逐遍正则替换的顺序一致
+    
+    Args:
+        text: 模板文本，已编译的块以占位符表示
+        blocks: 已编译块列表，占位符中的序号即列表下标
+        if_else: 是否识别 {% if %}...{% else %}...{% endif %}
+        if_plain: 是否识别 {% if %}...{% endif %}
+        
+    Returns:
+        操作元组
+    """
+    def stash(op) -> str:
+        blocks.append(op)
+        return f"\x00{len(blocks) - 1}\x00"
+    
+    if if_else:
+        # if-else分支内容随后还会经过普通if的识别
+        text = _TEMPLATE_IF_ELSE_RE.sub(lambda m: stash((
+            _OP_IF, tuple(m.group(1).strip().split('.')),
+            _compile_template_section(m.group(2), blocks, if_else=False),
+            _compile_template_section(m.group(3), blocks, if_else=False)
+        )), text)
+    if if_plain:
+        text = _TEMPLATE_IF_RE.sub(lambda m: stash((
+            _OP_IF, tuple(m.group(1).strip().split('.')),
+            _compile_template_section(m.group(2), blocks, if_else=False, if_plain=False),
+            ()
+        )), text)
+    
+    ops = []
+    pos = 0
+    for match in _TEMPLATE_PLACEHOLDER_RE.finditer(text):
+        _compile_var_text(text[pos:match.start()], ops)
+        ops.append(blocks[int(match.group(1))])
+        pos = match.end()
+    _compile_var_text(text[pos:], ops)
+    return tuple(ops)
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_template(template_path: str, mtime_ns: int) -> tuple:
+    """
+    读取并编译模板文件，按修改时间缓存，模板文件更新后自动重新编译
+    
+    Args:
+        template_path: 模板文件路径
+        mtime_ns: 模板文件修改时间，仅作为缓存键
+        
+    Returns:
+        操作元组
+    """
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template = f.read()
+    
+    blocks = []
+    
+    def stash_for(match) -> str:
+        blocks.append((
+            _OP_FOR, match.group(1), tuple(match.group(2).split('.')),
+            _compile_template_section(match.group(3), blocks)
+        ))
+        return f"\x00{len(blocks) - 1}\x00"
+    
+    # 先识别循环，再识别条件判断，最后识别变量
+    return _compile_template_section(_TEMPLATE_FOR_RE.sub(stash_for, template), blocks)
+
+
+def _render_template_ops(ops: tuple, context, variables: Dict[str, Any], parts: list):
+    """
+    执行编译后的模板操作，将输出片段追加到parts
+    
+    Args:
+        ops: 操作元组
+        context: 变量取值上下文（循环体内为叠加了循环变量的上下文）
+        variables: 模板变量字典，条件判断和循环列表从中取值
+        parts: 输出片段列表
+    """
+    # 输出只追加到同一个列表，最后由调用方一次性拼接，不产生中间字符串
+    append = parts.append
+    for op in ops:
+        kind = op[0]
+        if kind == _OP_TEXT:
+            append(op[1])
+        elif kind == _OP_VAR:
             try:
-                value = variables
-                for part in var_name.split('.'):
-                    if isinstance(value, dict):
-                        value = value.get(part)
-                    elif hasattr(value, part):
-                        value = getattr(value, part)
-                    else:
-                        value = None
-                        break
-                    if value is None:
-                        break
-                return str(value) if value is not None else default_value
+                value = _resolve_template_var(context, op[1])
             except (AttributeError, TypeError):
-                return default_value
-        
-        # 处理普通变量替换（包括点表示法）
-        def replace_regular_var(match):
-            var_name = match.group(1).strip()
-            # 处理点表示法，如 page.filename，支持嵌套dict和对象属性
+                value = None
+            if value is not None:
+                append(str(value))
+        elif kind == _OP_DEFAULT_VAR:
             try:
-                value = variables
-                for part in var_name.split('.'):
-                    if isinstance(value, dict):
-                        value = value.get(part)
-                    elif hasattr(value, part):
-                        value = getattr(value, part)
-                    else:
-                        value = None
-                        break
-                    if value is None:
-                        break
-                return str(value) if value is not None else ''
+                value = _resolve_template_var(context, op[1])
             except (AttributeError, TypeError):
-                return ''
-        
-        # 简单的条件判断处理，支持点表示法
-        def replace_if(match):
-            condition = match.group(1).strip()
-            if_content = match.group(2)
-            
-            # 处理点表示法的条件变量，例如 pagination_html
+                value = None
+            append(str(value) if value is not None else op[2])
+        elif kind == _OP_IF:
+            # 值为真（非None、非空字符串、非空列表等）时执行if分支
             try:
-                value = variables
-                for part in condition.split('.'):
-                    if isinstance(value, dict):
-                        value = value.get(part)
-                    else:
-                        value = getattr(value, part, None)
-                    if value is None:
-                        break
-                
-                # 检查值是否为真（非None、非空字符串、非空列表等）
-                if value:
-                    return if_content
-                return ""
+                value = _resolve_template_var(variables, op[1])
             except (AttributeError, TypeError):
-                return ""
-        
-        # 简单的循环处理（for page in pages_info）
-        def replace_for_loop(match):
-            loop_var = match.group(1)
-            list_var = match.group(2)
-            loop_content = match.group(3)
-            
-            # 获取循环数据
+                value = None
+            _render_template_ops(op[2] if value else op[3], context, variables, parts)
+        else:
             try:
-                items = variables
-                for part in list_var.split('.'):
-                    if isinstance(items, dict):
-                        items = items.get(part)
-                    else:
-                        items = getattr(items, part, None)
-                    if items is None:
-                        break
-                items = items or []
+                items = _resolve_template_var(variables, op[2]) or []
             except (AttributeError, TypeError):
                 items = []
-            
-            result = ""
+            if not items:
+                continue
+            # 循环体中与循环变量无关的部分对每一项都相同，每次渲染时每个循环只求值一次；
+            # 求值结果取决于本次渲染的模板变量，不能随编译结果缓存
+            loop_var = op[1]
+            segments = []
+            _specialize_loop_body(op[3], loop_var, variables, segments)
+            # 引用循环变量的操作直接从当前项取值，无需为每一项构造叠加了循环变量的上下文
             for item in items:
-                # 为每个item创建上下文
-                item_context = variables.copy()
-                item_context[loop_var] = item
-                
-                # 替换item中的变量
-                item_html = loop_content
-                
-                # 先处理item中的带默认值变量
-                # 注意：使用负断言确保 or 前后不是单词字符或点号，避免匹配到其他单词的一部分（如 formatted 中的 or）
-                def replace_item_default_var(match):
-                    var_name = match.group(1).strip()
-                    default_value = match.group(2).strip()
-                    # 移除默认值的引号
-                    if (default_value.startswith("'") and default_value.endswith("'") or \
-                       (default_value.startswith('"') and default_value.endswith('"'))):
-                        default_value = default_value[1:-1]
-                    # 从item_context中获取值
-                    try:
-                        value = item_context
-                        for part in var_name.split('.'):
-                            if isinstance(value, dict):
-                                value = value.get(part)
-                            elif hasattr(value, part):
-                                value = getattr(value, part)
-                            else:
-                                value = None
-                                break
-                            if value is None:
-                                break
-                        return str(value) if value is not None else default_value
-                    except (AttributeError, TypeError):
-                        return default_value
-                
-                item_html = re.sub(r'\{\{\s*([\w.]+)\s*(?<![\w.])or(?![\w.])\s*([^}]+)\s*\}\}', replace_item_default_var, item_html)
-                
-                # 然后处理item中的普通变量（包括点表示法）
-                def replace_item_var(match):
-                    var_name = match.group(1).strip()
+                for segment in segments:
+                    if segment.__class__ is str:
+                        append(segment)
+                        continue
                     try:
-                        value = item_context
-                        for part in var_name.split('.'):
-                            if isinstance(value, dict):
-                                value = value.get(part)
-                            elif hasattr(value, part):
-                                value = getattr(value, part)
-                            else:
-                                value = None
-                                break
-                            if value is None:
-                                break
-                        return str(value) if value is not None else ''
+                        value = _resolve_template_var(item, segment[1])
                     except (AttributeError, TypeError):
-                        return ''
-                
-                item_html = re.sub(r'\{\{\s*([\w.]+)\s*\}\}', replace_item_var, item_html)
-                
-                result += item_html
-            
-            return result
-        
-        # 渲染顺序：先处理循环，再处理条件判断，最后处理变量替换
-        # 1. 先处理循环
-        html = re.sub(r'\{\%\s*for\s+(\w+)\s+in\s+([\w.]+)\s*\%\}(.*?)\{\%\s*endfor\s*\%\}', 
-                     replace_for_loop, template, flags=re.DOTALL)
-        
-        # 2. 处理条件判断（支持点表示法）- 必须先于变量替换处理
-        def replace_if_with_else(match):
-            condition = match.group(1).strip()
-            if_content = match.group(2)
-            else_content = match.group(3)
-            
-            try:
-                value = variables
-                for part in condition.split('.'):
-                    if isinstance(value, dict):
-                        value = value.get(part)
-                    elif hasattr(value, part):
-                        value = getattr(value, part)
-                    else:
                         value = None
-                        break
-                    if value is None:
-                        break
-                
-                if value:
-                    return if_content
-                return else_content
-            except (AttributeError, TypeError):
-                return else_content
-        
-        def replace_if(match):
-            condition = match.group(1).strip()
-            if_content = match.group(2)
-            
+                    if value is not None:
+                        append(str(value))
+                    elif segment[0] == _OP_DEFAULT_VAR:
+                        append(segment[2])
+
+
+def _specialize_loop_body(ops: tuple, loop_var: str, variables: Dict[str, Any], segments: list):
+    """
+    预先求值循环体中与循环变量无关的操作（模板变量、条件判断），结果合并为字符串片段，
+    只保留引用循环变量的操作留待逐项求值
+    
+    结果依赖本次渲染的模板变量，每次渲染时对每个循环调用一次，不随编译结果缓存
+    
+    Args:
+        ops: 循环体操作元组
+        loop_var: 循环变量名
+        variables: 模板变量字典
+        segments: 输出列表，元素为字符串片段，或(操作类型, 相对循环变量的路径元组[, 默认值])
+    """
+    for op in ops:
+        kind = op[0]
+        if kind == _OP_IF:
             try:
-                value = variables
-                for part in condition.split('.'):
-                    if isinstance(value, dict):
-                        value = value.get(part)
-                    else:
-                        value = getattr(value, part, None)
-                    if value is None:
-                        break
-                
-                if value:
-                    return if_content
-                return ""
+                value = _resolve_template_var(variables, op[1])
             except (AttributeError, TypeError):
-                return ""
+                value = None
+            _specialize_loop_body(op[2] if value else op[3], loop_var, variables, segments)
+            continue
+        if kind != _OP_TEXT and op[1][0] == loop_var:
+            # 路径去掉循环变量名，逐项求值时直接从当前项开始取值
+            segments.append((kind, op[1][1:]) + op[2:])
+            continue
         
-        html = re.sub(r'\{\%\s*if\s+([\w.]+)\s*\%\}(.*?)\{\%\s*else\s*\%\}(.*?)\{\%\s*endif\s*\%\}', 
-                     replace_if_with_else, html, flags=re.DOTALL)
-        html = re.sub(r'\{\%\s*if\s+([\w.]+)\s*\%\}(.*?)\{\%\s*endif\s*\%\}', 
-                     replace_if, html, flags=re.DOTALL)
+        text_parts = []
+        _render_template_ops((op,), variables, variables, text_parts)
+        text = "".join(text_parts)
+        if segments and segments[-1].__class__ is str:
+            segments[-1] += text
+        else:
+            segments.append(text)
+
+
+def my_render_template(template_path: str, variables: Dict[str, Any]) -> str:
+    """
+    简单的模板渲染引擎
+    
+    Args:
+        template_path: 模板文件路径
+        variables: 模板变量字典
         
-        # 3. 处理模板级别的变量（非循环内的）- 最后处理
-        html = re.sub(r'\{\{\s*([\w.]+)\s*(?<![\w.])or(?![\w.])\s*([^}]+)\s*\}\}', replace_default_var, html)
-        html = re.sub(r'\{\{\s*([\w.]+)\s*\}\}', replace_regular_var, html)
+    Returns:
+        渲染后的HTML字符串
+    """
+    try:
+        ops = _compile_template(template_path, os.stat(template_path).st_mtime_ns)
         
-        return html
+        # 所有输出片段收集到同一个列表，最后一次性拼接
+        parts = []
+        _render_template_ops(ops, variables, variables, parts)
+        return "".join(parts)
         
     except Exception as e:
         logger.error(f"模板渲染失败 {template_path}: {e}")
@@ -269,6 +568,8 @@ class StaticPageServer:
         self.port = port
         self.is_running = False
         self.server_thread = None
+        # 静态页面管理器，由IntegratedStaticPageServer设置；在此统一初始化，请求处理时无需hasattr/getattr探测
+        self.static_page_manager = None
         
         # 从环境变量读取配置
         self.context_path = os.environ.get('WECHAT_MSG_CONTEXT_PATH', '').strip()
@@ -278,17 +579,37 @@ class StaticPageServer:
                 self.context_path = f'/{self.context_path}'
             if self.context_path.endswith('/'):
                 self.context_path = self.context_path[:-1]
+        # 由contextPath派生的页面地址，启动时拼接一次，请求处理时直接使用
+        self.static_pages_url = f'{self.context_path}/static-pages/'
+        self.chat_url = f'{self.context_path}/chat/'
         
         # 获取监听地址和端口
         self.host = os.getenv('WECHAT_MSG_SERVER_HOST', '0.0.0.0')
         # 使用WECHAT_MSG_SERVER_PORT作为统一端口
         self.port = int(os.getenv('WECHAT_MSG_SERVER_PORT', str(port)))
+        # gevent模式下同时处理的最大请求数，突发流量时超出的连接在监听队列中等待，避免无限创建greenlet
+        self.gevent_pool_size = int(os.getenv('WECHAT_MSG_SERVER_GEVENT_POOL_SIZE', '1024'))
         
         # 确保页面目录存在
         Path(self.pages_dir).mkdir(parents=True, exist_ok=True)
+        # 解析后的页面目录绝对路径，用于路径遍历检查
+        self._pages_dir_resolved = Path(self.pages_dir).resolve()
+        self._pages_dir_str = str(self._pages_dir_resolved)
+        # 页面目录内文件真实路径的公共前缀
+        self._pages_dir_prefix = self._pages_dir_str + os.sep
+        # 根目录文件（如域名校验文件）所在目录
+        self._files_dir_resolved = (_PROJECT_ROOT / "data" / "files").resolve()
+        # 网站图标在启动时读入内存，浏览器频繁请求时无需访问文件系统: (内容, ETag)
+        try:
+            favicon_bytes = (self._files_dir_resolved / "favicon.ico").read_bytes()
+            self._favicon = (favicon_bytes, hashlib.blake2b(favicon_bytes, digest_size=8).hexdigest())
+        except OSError:
+            self._favicon = None
         
         # 创建Flask应用实例
         self.app = Flask(__name__)
+        if _OrjsonJSONProvider is not None:
+            self.app.json = _OrjsonJSONProvider(self.app)
         
         # 微信消息处理相关配置
         # 微信消息AI响应缓存时间（秒）
@@ -301,23 +622,107 @@ class StaticPageServer:
         self.wechat_msg_ai_timeout_prompt = os.getenv('WECHAT_MSG_AI_TIMEOUT_PROMPT', '')
         # 微信消息AI缓存大小限制
         self.wechat_msg_ai_cache_size = int(os.getenv('WECHAT_MSG_AI_CACHE_SIZE', '100'))
+        # 微信消息AI交互模式，优先使用微信专用配置，默认使用block模式
+        self.wechat_interaction_mode = os.getenv('OPENAI_WECHAT_INTERACTION_MODE',
+                                                 os.getenv('OPENAI_INTERACTION_MODE', 'block')).strip().lower()
+        if self.wechat_interaction_mode not in ['stream', 'block']:
+            self.wechat_interaction_mode = 'block'  # 默认使用阻塞模式
+        # 页面问答交互模式，默认使用block模式
+        self.interaction_mode = os.getenv('OPENAI_INTERACTION_MODE', 'block').strip().lower()
+        if self.interaction_mode not in ['stream', 'block']:
+            self.interaction_mode = 'block'  # 默认使用阻塞模式
+        # 微信服务器配置的Token，用于签名验证
+        self.wechat_token = os.getenv('WECHAT_TOKEN')
+        # 签名校验使用的token字节串，启动时编码一次
+        self._wechat_token_bytes = (self.wechat_token or '').encode('utf-8')
+        # 配置功能密码，预先编码为bytes供常量时间比较使用
+        self.openai_config_password = os.getenv('OPENAI_CONFIG_PASSWORD')
+        self._config_password_bytes = (self.openai_config_password or '').encode('utf-8')
         
         # 反向代理配置
         # 从环境变量读取代理目标URL
         self.proxy_target_url = os.getenv('WECHAT_MSG_PROXY_TARGET_URL', '').strip()
+        # 代理请求共用的会话，复用到目标服务器的长连接，避免每个请求重新建立TCP/TLS连接
+        self._proxy_session = requests.Session()
+        self._proxy_session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=PROXY_POOL_MAXSIZE))
+        self._proxy_session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=PROXY_POOL_MAXSIZE))
         
         # 微信消息缓存结构: {msg_id: {"content": "响应内容", "expire_time": "过期时间"}}
-        self.wechat_msg_cache = {}
-        # 微信消息锁结构: {msg_id: threading.Lock()}
+        # 按写入顺序排列的OrderedDict，头部为最早过期的项
+        self.wechat_msg_cache = OrderedDict()
+        # 保护wechat_msg_cache的锁
+        self.wechat_msg_cache_lock = threading.Lock()
+        # 微信消息锁结构: {msg_id: [threading.Lock(), 使用者数]}，最后一个使用者释放后移除
         self.wechat_msg_locks = {}
         # 锁的锁，用于保护wechat_msg_locks的访问
         self.wechat_msg_locks_lock = threading.Lock()
         
+        # 首页渲染结果缓存: {"key": 依赖文件修改时间, "body": HTML字节, "etag": ETag, "checked_until": 下次校验时间}，
+        # STAT_CACHE_TTL秒内直接返回缓存，不再stat依赖文件
+        self._index_cache = {"key": None, "body": b"", "etag": "", "checked_until": 0.0}
+        self._index_cache_lock = threading.Lock()
+        # 聊天界面渲染结果缓存，结构同首页缓存，key为聊天模板修改时间
+        self._chat_cache = {"key": None, "body": b"", "etag": "", "checked_until": 0.0}
+        self._chat_cache_lock = threading.Lock()
+        
+        # 配置API GET响应缓存: ((模型, 交互模式), JSON响应体)
+        self._config_get_cache = None
+        
+        # 静态页面列表缓存（按创建时间倒序），页面生成/删除时增量更新，
+        # 仅在首次访问或存储数据被外部修改（如远程同步）时全量重建
+        self._pages_cache = None
+        self._pages_cache_key = None
+        # 页面列表版本号，列表每次被替换时递增，用于生成静态网页列表页的ETag
+        self._pages_cache_version = 0
+        self._pages_cache_lock = threading.Lock()
+        # ETag盐值，区分不同进程生命周期内相同的版本号
+        self._etag_salt = f"{os.getpid():x}-{time.time_ns():x}"
+        
+        # 静态页面文件检查结果缓存: {路径: (过期时间, 真实路径是否位于页面目录内, 普通文件的修改时间)}，
+        # 热门页面在有效期内不再重复访问文件系统，页面生成/删除时主动失效
+        self._stat_cache: Dict[str, tuple] = {}
+        self._stat_cache_lock = threading.Lock()
+        
+        # 热门页面内容LRU缓存: {路径: (下次校验时间, st_mtime_ns, 文件大小, 内容, ETag)}，
+        # 命中时无需open/read/close，每STAT_CACHE_TTL秒最多stat一次校验文件是否变化
+        self._page_content_cache: OrderedDict = OrderedDict()
+        self._page_content_cache_lock = threading.Lock()
+        
         # 注册路由
         self._setup_routes()
     
     def _setup_routes(self):
         """设置Flask路由"""
+        # 精确匹配的路由表：一次字典查找即可定位处理函数，无需逐个比较路径
+        self._get_routes = {
+            '/': self._generate_index_page,                             # 首页：显示静态存储信息
+            '/chat/': self._handle_chat_interface,                      # 聊天界面
+            '/api/config': self._handle_config_api,                     # 配置API（支持直接访问和chat下访问）
+            '/chat/api/config': self._handle_config_api,
+            '/api/verification-code': self._handle_verification_code_api,  # 验证码验证API
+            '/chat/api/verification-code': self._handle_verification_code_api,
+            '/api/generate-code': self._handle_generate_code_api,       # 验证码生成API
+            '/chat/api/generate-code': self._handle_generate_code_api,
+            '/api/validate-password': self._handle_validate_password,   # 密码验证API
+            '/wechat/reply': self._handle_wechat_verify,                # 微信服务器验证
+        }
+        if self._favicon is not None:
+            # 网站图标：使用启动时缓存的内容；未缓存时按根目录文件处理
+            self._get_routes['/favicon.ico'] = self._handle_favicon
+        self._post_routes = {
+            '/api/chat': self._handle_chat_api,                         # 聊天API（支持直接访问和chat下访问）
+            '/chat/api/send': self._handle_chat_api,
+            '/api/config': self._handle_config_api,                     # 配置API，由_handle_config_api统一处理GET和POST
+            '/chat/api/config': self._handle_config_api,
+            '/api/verification-code': self._handle_verification_code_api,  # 验证码验证API
+            '/chat/api/verification-code': self._handle_verification_code_api,
+            '/api/generate-code': self._handle_generate_code_api,       # 验证码生成API
+            '/chat/api/generate-code': self._handle_generate_code_api,
+            '/api/validate-password': self._handle_validate_password,   # 密码验证API
+            '/api/static-page/delete': self._handle_delete_static_page, # 静态页面删除API
+            '/wechat/reply': self._handle_wechat_message,               # 微信消息接收
+        }
+        
         # 路由处理函数 - 接受可变参数以处理Flask路由匹配
         def handle_all_requests(**kwargs):
             """处理所有请求的统一入口"""
@@ -340,7 +745,9 @@ class StaticPageServer:
                 path = full_path
             
             # 根据请求方法分发处理
-            if request.method == 'GET':
+            # HEAD与GET走相同的校验和响应头逻辑，由Werkzeug在发送时丢弃响应体，
+            # 静态页面以文件包装器返回，HEAD请求不会读取文件内容
+            if request.method in ('GET', 'HEAD'):
                 return self._handle_get_request(path)
             elif request.method == 'POST':
                 return self._handle_post_request(path)
@@ -360,34 +767,13 @@ class StaticPageServer:
     def _handle_get_request(self, path):
         """处理GET请求"""
         try:
-            # 路由处理
-            if path == '/':
-                # 首页：显示静态存储信息
-                return self._generate_index_page()
-            elif path == '/static-pages/':
-                # 静态网页列表页面
-                return self._generate_static_pages_list()
+            # 路由处理：先查精确匹配的路由表，再处理前缀路由
+            handler = self._get_routes.get(path)
+            if handler is not None:
+                return handler()
             elif path.startswith('/pages/'):
                 # 访问静态网页：/pages/filename.html
                 return self._handle_static_page(path)
-            elif path == '/chat/':
-                # 聊天界面
-                return self._handle_chat_interface()
-            elif path == '/api/config' or path == '/chat/api/config':
-                # 配置API（支持直接访问和chat下访问）
-                return self._handle_config_api()
-            elif path == '/api/verification-code' or path == '/chat/api/verification-code':
-                # 验证码验证API（支持直接访问和chat下访问）
-                return self._handle_verification_code_api()
-            elif path == '/api/generate-code' or path == '/chat/api/generate-code':
-                # 验证码生成API（支持直接访问和chat下访问）
-                return self._handle_generate_code_api()
-            elif path == '/api/validate-password':
-                # 密码验证API
-                return self._handle_validate_password()
-            elif path == '/wechat/reply':
-                # 微信服务器验证
-                return self._handle_wechat_verify()
             elif path.startswith('/proxy/'):
                 # 反向代理请求
                 return self._handle_proxy_request(path)
@@ -397,194 +783,452 @@ class StaticPageServer:
                 filename = path[1:]
                 if filename:
                     # 检查data/files目录下是否存在该文件
-                    # 使用绝对路径确保正确访问
-                    files_dir = Path(__file__).parent.parent.parent / "data" / "files"
-                    file_path = files_dir / filename
-                    if file_path.exists() and file_path.is_file():
+                    # 安全检查：防止路径遍历攻击
+                    file_path = self._resolve_within(self._files_dir_resolved, filename)
+                    if file_path is not None and file_path.is_file():
                         # 设置内容类型
-                        from mimetypes import guess_type
                         content_type, _ = guess_type(filename)
                         if not content_type:
                             content_type = 'application/octet-stream'
                         
-                        # 读取文件内容
-                        with open(file_path, 'rb') as f:
-                            content = f.read()
-                        
-                        return content, 200, {'Content-Type': content_type}
+                        # 以文件包装器流式发送，不将整个文件读入内存，
+                        # 服务器支持时由wsgi.file_wrapper使用sendfile零拷贝发送
+                        return send_file(file_path, mimetype=content_type, conditional=True, etag=True)
             
             # 如果没有匹配到任何路由，返回404
             return "Page not found", 404
                 
         except Exception as e:
-            logger.error(f"处理GET请求失败: {e}")
+            logger.error("处理GET请求失败: %s", e)
             return "Internal server error", 500
     
+    def _handle_favicon(self):
+        """处理网站图标请求，支持If-None-Match返回304"""
+        body, etag = self._favicon
+        response = Response(body, mimetype='image/x-icon')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = FAVICON_MAX_AGE
+        return response.make_conditional(request)
+    
     def _handle_post_request(self, path):
         """处理POST请求"""
         try:
-            # 路由处理
-            if path == '/api/chat' or path == '/chat/api/send':
-                # 聊天API（支持直接访问和chat下访问）
-                return self._handle_chat_api()
-            elif path == '/api/config' or path == '/chat/api/config':
-                # 配置API，由_handle_config_api统一处理GET和POST
-                return self._handle_config_api()
-            elif path == '/api/verification-code' or path == '/chat/api/verification-code':
-                # 验证码验证API（支持直接访问和chat下访问）
-                return self._handle_verification_code_api()
-            elif path == '/api/generate-code' or path == '/chat/api/generate-code':
-                # 验证码生成API（支持直接访问和chat下访问）
-                return self._handle_generate_code_api()
-            elif path == '/api/validate-password':
-                # 密码验证API
-                return self._handle_validate_password()
-            elif path == '/api/static-page/delete':
-                # 静态页面删除API
-                return self._handle_delete_static_page()
-            elif path == '/wechat/reply':
-                # 微信消息接收
-                return self._handle_wechat_message()
+            # 路由处理：查找精确匹配的路由表
+            handler = self._post_routes.get(path)
+            if handler is not None:
+                return handler()
             else:
                 return "Method not allowed", 405
                 
         except Exception as e:
-            logger.error(f"处理POST请求失败: {e}")
+            logger.error("处理POST请求失败: %s", e)
             return "Internal server error", 500
     
+    @staticmethod
+    def _resolve_within(base_dir: Path, filename: str) -> Optional[Path]:
+        """
+        解析请求的文件路径，并确认其位于指定目录内
+        
+        一次realpath同时处理 ..、绝对路径、反斜杠和符号链接等逃逸方式
+        
+        Args:
+            base_dir: 已解析的基准目录
+            filename: 请求中的相对文件名
+            
+        Returns:
+            解析后的文件路径，若越出基准目录或包含空字节则返回None
+        """
+        if '\x00' in filename:
+            return None
+        candidate = (base_dir / filename).resolve()
+        if candidate == base_dir or not candidate.is_relative_to(base_dir):
+            return None
+        return candidate
+    
     def _handle_static_page(self, request_path):
         """处理静态页面请求"""
         try:
             filename = request_path[7:]  # 去掉 '/pages/' 前缀
             
-            # 安全检查：防止路径遍历攻击
-            if '..' in filename or filename.startswith('/'):
+            # 安全检查：防止路径遍历攻击，页面文件名只能是页面目录下的单层文件名；
+            # 符号链接等其余逃逸方式再按真实路径确认位于页面目录内（结果按路径缓存）
+            if not filename:
+                return "File not found", 404
+            if '..' in filename or '/' in filename or '\\' in filename or '\0' in filename:
                 return "Forbidden", 403
-            
-            file_path = Path(self.pages_dir) / filename
-            
-            if not file_path.exists() or not file_path.is_file():
+            file_path = self._pages_dir_prefix + filename
+            within, mtime_ns = self._cached_page_stat(file_path)
+            if not within:
+                return "Forbidden", 403
+            if mtime_ns is None:
                 return "File not found", 404
             
             # 设置内容类型
             if filename.endswith('.html'):
-                # 读取并返回文件内容
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                return content, 200, {'Content-Type': 'text/html; charset=utf-8'}
+                # 客户端支持时优先发送页面生成时写入的预压缩版本；
+                # 预压缩版本早于HTML文件时说明HTML已在别处被替换（如远程同步覆盖），不再使用以免发送过期内容
+                send_path = file_path
+                content_encoding = None
+                for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+                    if request.accept_encodings[encoding]:
+                        variant_path = f"{file_path}{suffix}"
+                        variant_within, variant_mtime_ns = self._cached_page_stat(variant_path)
+                        if variant_within and variant_mtime_ns is not None and variant_mtime_ns >= mtime_ns:
+                            send_path = variant_path
+                            content_encoding = encoding
+                            break
+                
+                # 页面生成时已按UTF-8写入，直接以二进制方式发送，避免解码、编码；
+                # 小页面从内存缓存发送，大页面交给WSGI文件包装器
+                # conditional=True时会附带ETag/Last-Modified，并对If-None-Match/If-Modified-Since返回304
+                cached = self._get_cached_page_content(send_path)
+                if cached is not None:
+                    # 直接以缓存的bytes作为响应体一次写出，不经文件包装器按8KB分块读写
+                    body, etag, last_modified = cached
+                    response = Response(body, mimetype='text/html; charset=utf-8')
+                    response.set_etag(etag)
+                    response.last_modified = last_modified
+                    response.cache_control.public = True
+                    response.cache_control.max_age = STATIC_PAGE_MAX_AGE
+                    response = response.make_conditional(request, accept_ranges=True,
+                                                         complete_length=len(body))
+                else:
+                    response = send_file(send_path, mimetype='text/html; charset=utf-8',
+                                         conditional=True, etag=True, max_age=STATIC_PAGE_MAX_AGE)
+                if content_encoding:
+                    response.headers['Content-Encoding'] = content_encoding
+                response.vary.add('Accept-Encoding')
+                return response
             else:
                 return "Only HTML files are supported", 400
                 
         except Exception as e:
-            logger.error(f"处理静态页面请求失败: {e}")
+            logger.error("处理静态页面请求失败: %s", e)
             return "Internal server error", 500
     
-    def _generate_index_page(self):
-        """生成索引页面"""
-        try:
-            # 获取页面列表和统计信息
-            stats = {
-                'total_files': 0,
-                'total_size': 0,
-                'earliest_created': None,
-                'latest_created': None
-            }
-            
-            pages = []
-            # 优先使用static_page_manager获取数据
-            if hasattr(self, 'static_page_manager') and self.static_page_manager:
-                pages_info = self.static_page_manager.list_pages()
-                pages = pages_info.get('pages', [])
-                
-                # 使用静态页面管理器获取统计信息
-                stats_info = self.static_page_manager.get_storage_stats()
-                stats['total_files'] = stats_info['total_files']
-                stats['total_size'] = stats_info['total_size_bytes']
-                stats['earliest_created'] = stats_info['earliest_created']
-                stats['latest_created'] = stats_info['latest_created']
-            else:
-                # 备用方案：读取元数据
-                metadata_file = Path(self.pages_dir) / "metadata.json"
-                if metadata_file.exists():
-                    with open(metadata_file, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-                        pages = list(metadata.values())
-                    
-                    stats['total_files'] = len(pages)
-                    stats['total_size'] = sum(page.get('file_size', 0) for page in pages)
-                    
-                    if pages:
-                        created_times = [page.get('created_at', '') for page in pages if page.get('created_at')]
-                        created_times.sort()
-                        if created_times:
-                            stats['earliest_created'] = created_times[0]
-                            stats['latest_created'] = created_times[-1]
-            
-            # 格式化文件大小
-            def format_file_size(size_bytes):
-                if size_bytes == 0:
-                    return "0 B"
-                units = ['B', 'KB', 'MB', 'GB']
-                unit_index = 0
-                size = float(size_bytes)
-                
-                while size >= 1024 and unit_index < len(units) - 1:
-                    size /= 1024
-                    unit_index += 1
-                
-                return f"{size:.2f} {units[unit_index]}"
+    def _cached_page_stat(self, path: str) -> tuple:
+        """
+        检查页面目录下的文件，结果在STAT_CACHE_TTL秒内复用
+        
+        按真实路径判断是否位于页面目录内，用于拦截指向页面目录外的符号链接
+        
+        Args:
+            path: 页面目录下的文件路径
             
-            # 获取模板路径
-            template_path = Path(__file__).parent.parent.parent / "templates" / "index_template.html"
+        Returns:
+            (真实路径是否位于页面目录内, 普通文件的st_mtime_ns，不存在或不是普通文件时为None)
+        """
+        now = time.monotonic()
+        entry = self._stat_cache.get(path)
+        if entry is not None and entry[0] > now:
+            return entry[1], entry[2]
+        
+        real_path = os.path.realpath(path)
+        within = real_path.startswith(self._pages_dir_prefix)
+        mtime_ns = None
+        if within:
+            try:
+                st = os.stat(real_path)
+                if stat.S_ISREG(st.st_mode):
+                    mtime_ns = st.st_mtime_ns
+            except OSError:
+                pass
+        
+        with self._stat_cache_lock:
+            if path not in self._stat_cache and len(self._stat_cache) >= STAT_CACHE_MAXSIZE:
+                # 淘汰最早写入的条目
+                self._stat_cache.pop(next(iter(self._stat_cache)), None)
+            self._stat_cache[path] = (now + STAT_CACHE_TTL, within, mtime_ns)
+        return within, mtime_ns
+    
+    def _get_cached_page_content(self, path: Union[str, Path]) -> Optional[tuple]:
+        """
+        从内存缓存读取小页面内容，未命中时读取文件并加入缓存
+        
+        Args:
+            path: 页面文件（或其预压缩版本）路径
             
-            # 准备模板变量
-            template_vars = {
-                'title': '静态网页服务',
-                'subtitle': '生成和管理静态HTML网页的HTTP访问服务',
-                'pages_url': f'{self.context_path}/static-pages/',
-                'chat_url': f'{self.context_path}/chat',
-                'total_files': stats['total_files'],
-                'total_size': format_file_size(stats['total_size']),
-                'earliest_created': stats['earliest_created'],
-                'latest_created': stats['latest_created']
-            }
+        Returns:
+            (内容, ETag, 修改时间戳)，文件过大或读取失败时返回None
+        """
+        key = str(path)
+        now = time.monotonic()
+        with self._page_content_cache_lock:
+            entry = self._page_content_cache.get(key)
+            if entry is not None:
+                self._page_content_cache.move_to_end(key)
+        
+        try:
+            if entry is not None and entry[0] > now:
+                return entry[3], entry[4], entry[1] / 1e9
             
-            # 使用模板渲染 - 传递字典参数
-            template_vars = {
-                'context_path': self.context_path,
-                'wechat_official_account': os.getenv('WECHAT_OFFICIAL_ACCOUNT_NAME', 'AI析数助手')
-            }
+            st = os.stat(key)
+            if entry is not None and (entry[1], entry[2]) == (st.st_mtime_ns, st.st_size):
+                # 文件未变化，仅延长校验时间
+                entry = (now + STAT_CACHE_TTL,) + entry[1:]
+            else:
+                if st.st_size > PAGE_CONTENT_CACHE_MAX_BYTES:
+                    return None
+                with open(key, 'rb') as f:
+                    body = f.read()
+                etag = f"{st.st_mtime_ns:x}-{len(body):x}"
+                entry = (now + STAT_CACHE_TTL, st.st_mtime_ns, len(body), body, etag)
+        except OSError:
+            return None
+        
+        with self._page_content_cache_lock:
+            self._page_content_cache[key] = entry
+            self._page_content_cache.move_to_end(key)
+            while len(self._page_content_cache) > PAGE_CONTENT_CACHE_SIZE:
+                self._page_content_cache.popitem(last=False)
+        return entry[3], entry[4], entry[1] / 1e9
+    
+    def _invalidate_file_caches(self, filename: str):
+        """
+        使指定页面及其预压缩版本的stat缓存和内容缓存失效
+        
+        Args:
+            filename: 页面文件名
+        """
+        base = self._pages_dir_prefix + filename
+        keys = [base] + [f"{base}{suffix}" for _, suffix in PRECOMPRESSED_ENCODINGS]
+        with self._stat_cache_lock:
+            for key in keys:
+                self._stat_cache.pop(key, None)
+        with self._page_content_cache_lock:
+            for key in keys:
+                self._page_content_cache.pop(key, None)
+    
+    def _get_storage_db_mtime(self) -> Optional[int]:
+        """
+        获取静态页面管理器所用存储数据文件的修改时间
+        
+        Returns:
+            st_mtime_ns，未配置静态页面管理器或文件不存在时返回None
+        """
+        static_page_manager = self.static_page_manager
+        if not static_page_manager:
+            return None
+        try:
+            return os.stat(static_page_manager.storage_manager.db_file).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _build_page_entry(self, page_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        根据页面信息构建列表缓存项，补充文件存在状态和当前大小
+        
+        Args:
+            page_info: 页面信息
             
-            html = my_render_template(str(template_path), template_vars)
+        Returns:
+            列表缓存项
+        """
+        page = dict(page_info)
+        try:
+            page['current_size'] = (Path(self.pages_dir) / page['filename']).stat().st_size
+            page['exists'] = True
+        except OSError:
+            page['current_size'] = 0
+            page['exists'] = False
+        page['file_size_formatted'] = _format_file_size(_get_page_size(page))
+        return page
+    
+    def _get_pages_snapshot(self) -> tuple:
+        """
+        获取静态页面列表及其版本号，二者在同一把锁内读取，保证一致
+        
+        Returns:
+            (页面信息列表, 版本号)
+        """
+        static_page_manager = self.static_page_manager
+        if not static_page_manager:
+            return [], 0
+        
+        db_mtime = self._get_storage_db_mtime()
+        with self._pages_cache_lock:
+            if self._pages_cache is None or self._pages_cache_key != db_mtime:
+                pages = [dict(page) for page in static_page_manager.list_pages().get('pages', [])]
+                # 列表展示字段在缓存构建时一次性计算，避免每次请求重复格式化
+                for page in pages:
+                    page['file_size_formatted'] = _format_file_size(_get_page_size(page))
+                # list_pages已按创建时间倒序返回，无需再次排序
+                self._pages_cache = pages
+                self._pages_cache_key = db_mtime
+                self._pages_cache_version += 1
+            return self._pages_cache, self._pages_cache_version
+    
+    def add_page(self, page_info: Dict[str, Any]):
+        """
+        页面生成后增量更新页面列表缓存
+        
+        Args:
+            page_info: 新生成页面的信息
+        """
+        filename = page_info.get('filename')
+        if not filename:
+            return
+        
+        self._invalidate_file_caches(filename)
+        with self._pages_cache_lock:
+            if self._pages_cache is not None:
+                page = self._build_page_entry(page_info)
+                # 复制后替换，不修改读取方可能正在使用的旧列表
+                self._pages_cache = [page] + [p for p in self._pages_cache if p.get('filename') != filename]
+                self._pages_cache_key = self._get_storage_db_mtime()
+                self._pages_cache_version += 1
+        self.regenerate_index()
+    
+    def remove_page(self, filename: str):
+        """
+        页面删除后增量更新页面列表缓存
+        
+        Args:
+            filename: 被删除页面的文件名
+        """
+        self._invalidate_file_caches(filename)
+        with self._pages_cache_lock:
+            if self._pages_cache is not None:
+                self._pages_cache = [p for p in self._pages_cache if p.get('filename') != filename]
+                self._pages_cache_key = self._get_storage_db_mtime()
+                self._pages_cache_version += 1
+        self.regenerate_index()
+    
+    def _get_index_cache_key(self) -> tuple:
+        """
+        获取首页缓存键：基础首页只依赖首页模板，以模板的修改时间为键
+        
+        Returns:
+            由各依赖文件st_mtime_ns组成的元组，文件不存在时对应位置为None
+        """
+        try:
+            return (os.stat(_INDEX_TEMPLATE).st_mtime_ns,)
+        except OSError:
+            return (None,)
+    
+    def _refresh_index_cache(self, force: bool = False) -> Dict[str, Any]:
+        """
+        获取首页渲染缓存，依赖文件有变化时重新渲染
+        
+        Args:
+            force: 是否忽略校验间隔，立即检查依赖文件是否变化
+        
+        Returns:
+            首页缓存字典，包含key、body、etag
+        """
+        now = time.monotonic()
+        index_cache = self._index_cache
+        if not force and index_cache["checked_until"] > now:
+            return index_cache
+        
+        cache_key = self._get_index_cache_key()
+        with self._index_cache_lock:
+            if self._index_cache["key"] != cache_key:
+                body = self._render_index_page().encode('utf-8')
+                self._index_cache = {
+                    "key": cache_key,
+                    "body": body,
+                    "etag": hashlib.blake2b(body, digest_size=8).hexdigest(),
+                    "checked_until": now + STAT_CACHE_TTL
+                }
+            else:
+                self._index_cache["checked_until"] = now + STAT_CACHE_TTL
+            return self._index_cache
+    
+    def regenerate_index(self):
+        """
+        预渲染首页，使页面变化后的首个首页请求无需再渲染模板
+        
+        在服务器启动及页面生成/删除后调用
+        """
+        try:
+            self._refresh_index_cache(force=True)
+        except Exception as e:
+            logger.warning(f"预渲染首页失败: {e}")
+    
+    def _generate_index_page(self):
+        """生成索引页面，渲染结果按依赖文件修改时间缓存"""
+        try:
+            index_cache = self._refresh_index_cache()
             
-            return html, 200, {'Content-Type': 'text/html; charset=utf-8'}
+            response = Response(index_cache["body"], content_type='text/html; charset=utf-8')
+            response.set_etag(index_cache["etag"])
+            return response.make_conditional(request)
             
         except Exception as e:
-            logger.error(f"生成索引页面失败: {e}")
+            logger.error("生成索引页面失败: %s", e)
             return "<h1>错误</h1><p>无法加载页面列表</p>", 500
     
+    def _render_index_page(self) -> str:
+        """
+        渲染索引页面
+        
+        Returns:
+            渲染后的HTML字符串
+        """
+        # 获取模板路径
+        template_path = _INDEX_TEMPLATE
+        
+        # 使用模板渲染 - 传递字典参数
+        template_vars = {
+            'context_path': self.context_path,
+            'wechat_official_account': os.getenv('WECHAT_OFFICIAL_ACCOUNT_NAME', 'AI析数助手')
+        }
+        
+        return my_render_template(template_path, template_vars)
+    
     def _handle_chat_interface(self):
-        """处理聊天界面请求"""
+        """处理聊天界面请求，渲染结果按模板修改时间缓存"""
         try:
-            # 获取聊天模板路径
-            template_path = Path(__file__).parent.parent.parent / "templates" / "chat_template.html"
-            
-            # 准备模板变量
-            template_vars = {
-                'context_path': self.context_path,
-                'wechat_official_account': os.getenv('WECHAT_OFFICIAL_ACCOUNT_NAME', 'AI析数助手')
-            }
-            
-            # 使用模板渲染 - 传递字典参数
-            html = my_render_template(str(template_path), template_vars)
+            now = time.monotonic()
+            chat_cache = self._chat_cache
+            if chat_cache["checked_until"] <= now:
+                chat_cache = self._refresh_chat_cache(now)
             
             # 返回渲染后的内容
-            return html, 200, {'Content-Type': 'text/html; charset=utf-8'}
+            response = Response(chat_cache["body"], content_type='text/html; charset=utf-8')
+            response.set_etag(chat_cache["etag"])
+            return response.make_conditional(request)
             
         except Exception as e:
             logger.error(f"处理聊天界面失败: {e}")
             return "<h1>错误</h1><p>无法加载聊天界面</p>", 500
     
+    def _refresh_chat_cache(self, now: float) -> Dict[str, Any]:
+        """
+        检查聊天模板是否变化，有变化时重新渲染聊天界面
+        
+        Args:
+            now: 当前time.monotonic()时间
+            
+        Returns:
+            聊天界面缓存字典，包含key、body、etag
+        """
+        # 获取聊天模板路径
+        template_path = _CHAT_TEMPLATE
+        cache_key = os.stat(template_path).st_mtime_ns
+        
+        with self._chat_cache_lock:
+            if self._chat_cache["key"] != cache_key:
+                # 准备模板变量
+                template_vars = {
+                    'context_path': self.context_path,
+                    'wechat_official_account': os.getenv('WECHAT_OFFICIAL_ACCOUNT_NAME', 'AI析数助手')
+                }
+                
+                # 使用模板渲染 - 传递字典参数
+                body = my_render_template(template_path, template_vars).encode('utf-8')
+                self._chat_cache = {
+                    "key": cache_key,
+                    "body": body,
+                    "etag": hashlib.blake2b(body, digest_size=8).hexdigest(),
+                    "checked_until": now + STAT_CACHE_TTL
+                }
+            else:
+                self._chat_cache["checked_until"] = now + STAT_CACHE_TTL
+            return self._chat_cache
+    
     def _validate_request_password(self):
         """验证请求中的密码是否正确（支持明文和md5+盐两种方式）
         
@@ -594,14 +1238,11 @@ class StaticPageServer:
         try:
             # 从请求头获取密码
             password = request.headers.get('X-Config-Password')
-            logger.debug(f"收到密码验证请求，密码头: {password[:20] if password else 'None'}...")
+            logger.debug("收到密码验证请求，密码头存在: %s", password is not None)
             
             # 如果请求头中没有，尝试从请求体获取
             if not password:
                 try:
-                    # 尝试读取原始请求体
-                    raw_data = request.get_data(as_text=True)
-                    
                     # 尝试解析为JSON，捕获异常并返回空字典
                     try:
                         data = request.get_json()
@@ -614,31 +1255,32 @@ class StaticPageServer:
                     data = request.form
                     password = data.get('password')
             
-            # 从环境变量获取配置密码
-            openai_config_password = os.getenv('OPENAI_CONFIG_PASSWORD')
-            logger.debug(f"环境变量密码配置存在: {openai_config_password is not None}")
+            # 配置密码在初始化时从环境变量读取
+            openai_config_password = self.openai_config_password
             
             # 验证密码
             if not openai_config_password:
                 logger.warning("环境变量中未配置密码")
                 return False
+            if not isinstance(password, str):
+                logger.debug("密码验证失败：未提供密码")
+                return False
             
-            # 支持两种验证方式：明文和md5+盐
-            if password == openai_config_password:
+            # 支持两种验证方式：明文和md5+盐，均使用常量时间比较，且不在日志中输出密码
+            if hmac.compare_digest(password.encode('utf-8'), self._config_password_bytes):
                 # 明文验证（向后兼容）
                 logger.debug("密码验证成功：明文匹配")
                 return True
-            elif password and ':' in password:
+            elif ':' in password:
                 # md5+盐验证（格式：encrypted_password:salt）
-                import hashlib
                 encrypted_password, salt = password.split(':', 1)
-                logger.debug(f"尝试md5+盐验证，salt长度: {len(salt)}")
+                logger.debug("尝试md5+盐验证，salt长度: %d", len(salt))
                 if len(salt) >= 8:
                     # 使用相同的盐值对环境变量中的密码进行md5加密
                     expected_password = hashlib.md5(f"{openai_config_password}{salt}".encode('utf-8')).hexdigest()
-                    logger.debug(f"期望密码: {expected_password}, 收到密码: {encrypted_password}")
-                    result = encrypted_password == expected_password
-                    logger.debug(f"md5验证结果: {result}")
+                    result = hmac.compare_digest(encrypted_password.encode('utf-8'),
+                                                 expected_password.encode('ascii'))
+                    logger.debug("md5验证结果: %s", result)
                     return result
                 else:
                     logger.warning(f"salt长度不足8位: {len(salt)}")
@@ -655,12 +1297,12 @@ class StaticPageServer:
             if request.method == 'POST':
                 # 验证密码
                 if not self._validate_request_password():
-                    return json.dumps({'success': False, 'message': 'Invalid password'}), 401, {'Content-Type': 'application/json'}
+                    return _INVALID_PASSWORD_BODY, 401, {'Content-Type': 'application/json'}
                     
                 # 处理配置保存请求
                 data = request.get_json()
                 if not data:
-                    return json.dumps({'error': '无效的请求数据'}), 400, {'Content-Type': 'application/json'}
+                    return _INVALID_REQUEST_DATA_BODY, 400, {'Content-Type': 'application/json'}
                 
                 # 从请求数据中提取配置参数
                 api_url = data.get('api_url', '')
@@ -670,7 +1312,7 @@ class StaticPageServer:
                 
                 # 验证必要参数
                 if not all([api_url, api_key, model]):
-                    return json.dumps({'error': '缺少必要的配置参数'}), 400, {'Content-Type': 'application/json'}
+                    return _dumps({'error': '缺少必要的配置参数'}), 400, {'Content-Type': 'application/json'}
                 
                 # 获取AI服务实例并保存配置
                 set_ai_service("web", api_url, api_key, model, system_prompt)
@@ -678,31 +1320,31 @@ class StaticPageServer:
                 success = ai_service.save_config(api_url, api_key, model, system_prompt)
                 
                 if success:
-                    return json.dumps({'success': True, 'message': '配置保存成功'}), 200, {'Content-Type': 'application/json'}
+                    return _dumps({'success': True, 'message': '配置保存成功'}), 200, {'Content-Type': 'application/json'}
                 else:
-                    return json.dumps({'error': '配置保存失败'}), 500, {'Content-Type': 'application/json'}
+                    return _dumps({'error': '配置保存失败'}), 500, {'Content-Type': 'application/json'}
             else:  # GET请求
-                # 从环境变量读取交互模式
-                interaction_mode = os.getenv('OPENAI_INTERACTION_MODE', 'block').strip().lower()
-                # 验证交互模式
-                if interaction_mode not in ['stream', 'block']:
-                    interaction_mode = 'block'  # 默认使用阻塞模式
+                # 交互模式在初始化时从环境变量读取
+                interaction_mode = self.interaction_mode
                 
-                # 获取AI服务实例和配置信息
+                # 获取AI服务实例，响应体按(模型, 交互模式)缓存，配置未变化时直接复用序列化结果
                 ai_service = get_ai_service()
-                ai_config = ai_service.get_config_info()
-                
-                # 返回配置信息
-                config = {
-                    'aiService': 'openai',
-                    'model': ai_config.get('model', 'gpt-3.5-turbo'),
-                    'interactionMode': interaction_mode
-                }
-                return json.dumps(config), 200, {'Content-Type': 'application/json'}
+                cache_key = (ai_service.model, interaction_mode)
+                config_body = self._config_get_cache
+                if config_body is None or config_body[0] != cache_key:
+                    # 返回配置信息
+                    config = {
+                        'aiService': 'openai',
+                        'model': ai_service.model,
+                        'interactionMode': interaction_mode
+                    }
+                    config_body = (cache_key, _dumps(config))
+                    self._config_get_cache = config_body
+                return config_body[1], 200, {'Content-Type': 'application/json'}
             
         except Exception as e:
             logger.error(f"处理配置API失败: {e}")
-            return json.dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
+            return _dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
     
     def _handle_verification_code_api(self):
         """处理验证码验证API请求，不需要密码验证"""
@@ -711,27 +1353,25 @@ class StaticPageServer:
                 # 处理验证码验证请求
                 data = request.get_json()
                 if not data:
-                    return json.dumps({'error': '无效的请求数据'}), 400, {'Content-Type': 'application/json'}
+                    return _INVALID_REQUEST_DATA_BODY, 400, {'Content-Type': 'application/json'}
                 
                 # 只支持验证验证码
                 action = data.get('action', 'validate')
                 if action != 'validate':
-                    return json.dumps({'error': '验证码API只支持验证操作'}), 400, {'Content-Type': 'application/json'}
+                    return _dumps({'error': '验证码API只支持验证操作'}), 400, {'Content-Type': 'application/json'}
                 
                 custom_code = data.get('custom_code')
                 
-                # 导入存储管理器
-                from shared.storage.storage_manager import StorageManager
                 storage_manager = StorageManager()
                 
                 # 验证验证码
                 return self._validate_verification_code(storage_manager, custom_code)
             else:
-                return json.dumps({'error': '验证码验证API只支持POST请求'}), 405, {'Content-Type': 'application/json'}
+                return _dumps({'error': '验证码验证API只支持POST请求'}), 405, {'Content-Type': 'application/json'}
             
         except Exception as e:
             logger.error(f"处理验证码验证API失败: {e}")
-            return json.dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
+            return _dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
     
     def _handle_generate_code_api(self):
         """处理验证码生成API请求，需要密码验证"""
@@ -739,56 +1379,50 @@ class StaticPageServer:
             if request.method == 'POST':
                 # 验证密码（复用现有的密码验证方法）
                 if not self._validate_request_password():
-                    return json.dumps({'success': False, 'message': 'Invalid password'}), 401, {'Content-Type': 'application/json'}
+                    return _INVALID_PASSWORD_BODY, 401, {'Content-Type': 'application/json'}
                     
                 # 处理验证码生成请求
                 data = request.get_json()
                 if not data:
-                    return json.dumps({'error': '无效的请求数据'}), 400, {'Content-Type': 'application/json'}
+                    return _INVALID_REQUEST_DATA_BODY, 400, {'Content-Type': 'application/json'}
                 
                 # 只支持生成验证码
                 action = data.get('action', 'generate')
                 if action != 'generate':
-                    return json.dumps({'error': '验证码生成API只支持生成操作'}), 400, {'Content-Type': 'application/json'}
+                    return _dumps({'error': '验证码生成API只支持生成操作'}), 400, {'Content-Type': 'application/json'}
                 
                 custom_code = data.get('custom_code')
                 
-                # 导入存储管理器
-                from shared.storage.storage_manager import StorageManager
                 storage_manager = StorageManager()
                 
                 # 生成验证码
                 return self._generate_verification_code(storage_manager, custom_code)
             else:  # GET请求
                 # 生成验证码（GET方式用于简单生成）
-                from shared.storage.storage_manager import StorageManager
                 storage_manager = StorageManager()
                 return self._generate_verification_code(storage_manager, None)
             
         except Exception as e:
             logger.error(f"处理验证码生成API失败: {e}")
-            return json.dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
+            return _dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
     
     def _generate_verification_code(self, storage_manager, custom_code: str = None):
         """生成验证码"""
-        import uuid
-        from datetime import datetime, timedelta
-        
         if custom_code:
             # 验证自定义验证码格式
             if len(custom_code) < 8:
-                return json.dumps({'error': '验证码长度必须大于等于8位'}), 400, {'Content-Type': 'application/json'}
+                return _dumps({'error': '验证码长度必须大于等于8位'}), 400, {'Content-Type': 'application/json'}
             
             # 检查是否包含英文字母和数字
             has_letter = any(c.isalpha() for c in custom_code)
             has_digit = any(c.isdigit() for c in custom_code)
             
             if not (has_letter and has_digit):
-                return json.dumps({'error': '验证码必须包含英文字母和数字'}), 400, {'Content-Type': 'application/json'}
+                return _dumps({'error': '验证码必须包含英文字母和数字'}), 400, {'Content-Type': 'application/json'}
             
             # 检查是否已存在
             if storage_manager.get_verification_code(custom_code):
-                return json.dumps({'error': '该验证码已存在，请选择其他验证码'}), 400, {'Content-Type': 'application/json'}
+                return _dumps({'error': '该验证码已存在，请选择其他验证码'}), 400, {'Content-Type': 'application/json'}
             
             verification_code = custom_code
         else:
@@ -822,7 +1456,7 @@ class StaticPageServer:
         
         storage_manager.save_verification_code(code_info)
         
-        return json.dumps({
+        return _dumps({
             'success': True, 
             'code': verification_code,
             'expires_at': expires_at.isoformat(),
@@ -833,59 +1467,57 @@ class StaticPageServer:
     def _validate_verification_code(self, storage_manager, code: str):
         """验证验证码"""
         if not code:
-            return json.dumps({'error': '请提供验证码'}), 400, {'Content-Type': 'application/json'}
+            return _dumps({'error': '请提供验证码'}), 400, {'Content-Type': 'application/json'}
         
         # 获取验证码信息
         code_info = storage_manager.get_verification_code(code)
         
         if not code_info:
-            return json.dumps({'valid': False, 'message': '验证码不存在'}), 200, {'Content-Type': 'application/json'}
+            return _dumps({'valid': False, 'message': '验证码不存在'}), 200, {'Content-Type': 'application/json'}
         
         # 检查是否已过期
-        from datetime import datetime
         expires_at = datetime.fromisoformat(code_info['expires_at'])
         if datetime.now() > expires_at:
-            return json.dumps({'valid': False, 'message': '验证码已过期'}), 200, {'Content-Type': 'application/json'}
+            return _dumps({'valid': False, 'message': '验证码已过期'}), 200, {'Content-Type': 'application/json'}
         
         # 检查是否已使用
         if code_info.get('used', False):
-            return json.dumps({'valid': False, 'message': '验证码已使用'}), 200, {'Content-Type': 'application/json'}
+            return _dumps({'valid': False, 'message': '验证码已使用'}), 200, {'Content-Type': 'application/json'}
         
-        return json.dumps({'valid': True, 'message': '验证码有效'}), 200, {'Content-Type': 'application/json'}
+        return _dumps({'valid': True, 'message': '验证码有效'}), 200, {'Content-Type': 'application/json'}
     
     def _use_verification_code(self, storage_manager, code: str):
         """使用验证码（标记为已使用）"""
         if not code:
-            return json.dumps({'error': '请提供验证码'}), 400, {'Content-Type': 'application/json'}
+            return _dumps({'error': '请提供验证码'}), 400, {'Content-Type': 'application/json'}
         
         # 先验证验证码是否有效
         code_info = storage_manager.get_verification_code(code)
         
         if not code_info:
-            return json.dumps({'error': '验证码不存在'}), 400, {'Content-Type': 'application/json'}
+            return _dumps({'error': '验证码不存在'}), 400, {'Content-Type': 'application/json'}
         
         # 检查是否已过期
-        from datetime import datetime
         expires_at = datetime.fromisoformat(code_info['expires_at'])
         if datetime.now() > expires_at:
-            return json.dumps({'error': '验证码已过期'}), 400, {'Content-Type': 'application/json'}
+            return _dumps({'error': '验证码已过期'}), 400, {'Content-Type': 'application/json'}
         
         # 检查是否已使用
         if code_info.get('used', False):
-            return json.dumps({'error': '验证码已使用'}), 400, {'Content-Type': 'application/json'}
+            return _dumps({'error': '验证码已使用'}), 400, {'Content-Type': 'application/json'}
         
         # 标记为已使用
         success = storage_manager.mark_verification_code_used(code)
         
         if success:
-            return json.dumps({'success': True, 'message': '验证码使用成功'}), 200, {'Content-Type': 'application/json'}
+            return _dumps({'success': True, 'message': '验证码使用成功'}), 200, {'Content-Type': 'application/json'}
         else:
-            return json.dumps({'error': '验证码使用失败'}), 500, {'Content-Type': 'application/json'}
+            return _dumps({'error': '验证码使用失败'}), 500, {'Content-Type': 'application/json'}
     
     def _cleanup_expired_codes(self, storage_manager):
         """清理过期验证码"""
         cleaned_count = storage_manager.cleanup_expired_verification_codes()
-        return json.dumps({
+        return _dumps({
             'success': True, 
             'cleaned_count': cleaned_count,
             'message': f'清理完成，删除了 {cleaned_count} 个过期验证码'
@@ -912,7 +1544,7 @@ class StaticPageServer:
                 target_url = self.proxy_target_url
             
             # 转发请求到目标URL
-            logger.info(f"代理请求: {path} -> {target_url}")
+            logger.info("代理请求: %s -> %s", path, target_url)
             
             # 转发请求头
             headers = dict(request.headers)
@@ -920,9 +1552,11 @@ class StaticPageServer:
             headers.pop('Host', None)
             # 移除Accept-Encoding头，让requests不使用压缩
             headers.pop('Accept-Encoding', None)
+            # Connection为逐跳头，不转发，避免客户端的Connection: close关闭连接池中的连接
+            headers.pop('Connection', None)
             
             # 发送GET请求到目标URL，禁止压缩以避免解码问题
-            response = requests.get(
+            response = self._proxy_session.get(
                 target_url,
                 headers=headers,
                 params=request.args,
@@ -938,7 +1572,7 @@ class StaticPageServer:
             problematic_headers = ['Content-Encoding', 'Transfer-Encoding', 'Content-Length']
             for header in problematic_headers:
                 if header in response_headers:
-                    logger.debug(f"移除响应头: {header} = {response_headers[header]}")
+                    logger.debug("移除响应头: %s = %s", header, response_headers[header])
                     response_headers.pop(header)
             
             # 确保Content-Type头存在，避免浏览器猜测
@@ -947,19 +1581,21 @@ class StaticPageServer:
                 logger.debug("未检测到Content-Type头，设置默认值为text/html; charset=utf-8")
             
             # 返回响应 - 使用iter_content确保内容正确处理
-            logger.info(f"代理响应: {target_url} -> 状态码: {response.status_code}")
-            return Response(
+            logger.info("代理响应: %s -> 状态码: %s", target_url, response.status_code)
+            proxy_response = Response(
                 response.iter_content(chunk_size=1024, decode_unicode=False),  # 不自动解码，保持原始字节
                 status=response.status_code,
                 headers=response_headers
             )
+            # 响应结束（含客户端中途断开）时释放上游连接，使其回到连接池
+            proxy_response.call_on_close(response.close)
+            return proxy_response
             
         except requests.exceptions.RequestException as e:
             logger.error(f"代理请求失败: {e}")
             return f"Proxy request failed: {e}", 502
         except Exception as e:
             logger.error(f"处理代理请求时发生错误: {e}")
-            import traceback
             logger.error(f"错误堆栈: {traceback.format_exc()}")
             return f"Proxy error: {e}", 500
     
@@ -971,19 +1607,26 @@ class StaticPageServer:
             timestamp = request.args.get('timestamp', '')
             nonce = request.args.get('nonce', '')
             
-            # 从环境变量获取token
-            token = os.getenv('WECHAT_TOKEN')
+            token = self._wechat_token_bytes
             if not token:
                 logger.error("WECHAT_TOKEN环境变量未配置")
                 return False
             
-            # 验证签名
-            temp_list = [token, timestamp, nonce]
-            temp_list.sort()
-            temp_str = ''.join(temp_list)
-            sha1_hash = hashlib.sha1(temp_str.encode('utf-8')).hexdigest()
-            
-            return sha1_hash == signature
+            # 验证签名，使用常量时间比较
+            # 只有三个参数，用三次比较交换完成字典序排序，免去构造序列和调用sorted；
+            # UTF-8字节序与字符串码点顺序一致，直接对字节排序并逐段写入哈希，免去拼接
+            a, b, c = token, timestamp.encode('utf-8'), nonce.encode('utf-8')
+            if a > b:
+                a, b = b, a
+            if b > c:
+                b, c = c, b
+            if a > b:
+                a, b = b, a
+            sha1 = hashlib.sha1(a)
+            sha1.update(b)
+            sha1.update(c)
+            
+            return hmac.compare_digest(sha1.hexdigest().encode('ascii'), signature.encode('utf-8'))
             
         except Exception as e:
             logger.error(f"验证微信签名失败: {e}")
@@ -1006,28 +1649,24 @@ class StaticPageServer:
     
     def _handle_chat_api(self):
         """处理聊天API请求"""
-        import time
         start_time = time.time()
         
         try:
             # 获取请求数据 - 这是第一个瓶颈点
             data = request.get_json()
             if not data:
-                return json.dumps({'error': '无效的请求数据'}), 400, {'Content-Type': 'application/json'}
+                return _INVALID_REQUEST_DATA_BODY, 400, {'Content-Type': 'application/json'}
             
             # 获取用户消息
             user_message = data.get('message')
             if not user_message:
-                return json.dumps({'error': '请提供消息内容'}), 400, {'Content-Type': 'application/json'}
+                return _dumps({'error': '请提供消息内容'}), 400, {'Content-Type': 'application/json'}
             
             # 获取对话历史（可选）
             conversation_history = data.get('history', [])
             
-            # 从环境变量读取交互模式
-            interaction_mode = os.getenv('OPENAI_INTERACTION_MODE', 'block').strip().lower()
-            # 验证交互模式
-            if interaction_mode not in ['stream', 'block']:
-                interaction_mode = 'block'  # 默认使用阻塞模式
+            # 交互模式在初始化时从环境变量读取
+            interaction_mode = self.interaction_mode
             
             # 获取AI服务实例 - 全局单例，避免重复创建
             ai_service = get_ai_service()
@@ -1035,13 +1674,6 @@ class StaticPageServer:
             if interaction_mode == 'stream':
                 # 流式响应处理 - 优化事件循环管理
                 def generate():
-                    # 确保每个线程都有自己的事件循环
-                    try:
-                        loop = asyncio.get_event_loop()
-                    except RuntimeError:
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                                        
                     # 直接调用ai_service.stream_chat，减少中间层嵌套
                     async def stream_wrapper():
                         try:
@@ -1049,37 +1681,77 @@ class StaticPageServer:
                                 user_message=user_message,
                                 conversation_history=conversation_history
                             ):
-                                yield f"data: {json.dumps({'success': True, 'message': chunk, 'interaction_mode': 'stream'})}\n\n"
+                                yield _sse_event({'success': True, 'message': chunk, 'interaction_mode': 'stream'})
                         except Exception as e:
                             logger.error(f"流式响应异常: {e}")
-                            yield f"data: {json.dumps({'error': str(e), 'success': False})}\n\n"
+                            yield _sse_event({'error': str(e), 'success': False})
                     
-                    # 运行异步生成器
+                    # 后台事件循环中的生产者任务持续拉取分片放入队列，请求线程只从队列取出写出，
+                    # 上游读取与向客户端写出并行进行，无需每个分片都跨线程调度一次
                     async_gen = stream_wrapper()
+                    chunks = queue.SimpleQueue()
+                    end_of_stream = object()
                     
-                    while True:
+                    async def produce():
                         try:
-                            chunk = loop.run_until_complete(async_gen.__anext__())
-                            yield chunk
-                        except StopAsyncIteration:
-                            break
+                            async for chunk in async_gen:
+                                chunks.put(chunk)
                         except Exception as e:
                             logger.error(f"流式响应迭代异常: {e}")
-                            break
+                        finally:
+                            await async_gen.aclose()
+                            chunks.put(end_of_stream)
+                    
+                    producer = asyncio.run_coroutine_threadsafe(produce(), get_background_loop())
+                    
+                    # 待写出的分片缓冲
+                    buffer = []
+                    buffer_len = 0
+                    last_flush = time.monotonic()
+                    try:
+                        while True:
+                            # 缓冲为空时一直等待下一分片，否则最多等到本次合并窗口结束
+                            wait_timeout = None
+                            if buffer:
+                                wait_timeout = max(0.0, SSE_FLUSH_INTERVAL - (time.monotonic() - last_flush))
+                            try:
+                                chunk = chunks.get(timeout=wait_timeout)
+                            except queue.Empty:
+                                # 合并窗口结束仍未收到新分片，先写出已缓冲的内容
+                                yield b"".join(buffer)
+                                buffer.clear()
+                                buffer_len = 0
+                                last_flush = time.monotonic()
+                                continue
+                            if chunk is end_of_stream:
+                                break
+                            
+                            buffer.append(chunk)
+                            buffer_len += len(chunk)
+                            if buffer_len >= SSE_FLUSH_BYTES or time.monotonic() - last_flush >= SSE_FLUSH_INTERVAL:
+                                yield b"".join(buffer)
+                                buffer.clear()
+                                buffer_len = 0
+                                last_flush = time.monotonic()
+                        
+                        if buffer:
+                            yield b"".join(buffer)
+                    finally:
+                        # 客户端提前断开时取消生产者任务，其finally会关闭异步生成器，释放上游AI接口连接
+                        if not producer.done():
+                            producer.cancel()
+                            concurrent.futures.wait([producer], timeout=1)
                 
-                # 返回SSE响应
-                return Response(generate(), mimetype='text/event-stream')
+                # 返回SSE响应：禁止缓存，并关闭反向代理（如Nginx）的响应缓冲，使每个分片立即送达客户端
+                return Response(generate(), mimetype='text/event-stream', headers={
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no'
+                })
             else:
-                # 阻塞模式处理 - 确保每个线程都有自己的事件循环
-                try:
-                    loop = asyncio.get_event_loop()
-                except RuntimeError:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-
+                # 阻塞模式处理
                 try:
                     # 调用AI服务获取回复
-                    ai_reply = loop.run_until_complete(
+                    ai_reply = run_coroutine(
                         ai_service.simple_chat(
                             user_message=user_message,
                             conversation_history=conversation_history,
@@ -1088,10 +1760,10 @@ class StaticPageServer:
                     )
                 except Exception as e:
                     logger.error(f"阻塞模式调用异常: {e}")
-                    return json.dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
+                    return _dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
                 
                 # 返回AI回复
-                return json.dumps({
+                return _dumps({
                     'success': True,
                     'message': ai_reply,
                     'interaction_mode': interaction_mode
@@ -1099,95 +1771,122 @@ class StaticPageServer:
             
         except Exception as e:
             logger.error(f"处理聊天API失败: {e}")
-            return json.dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
+            return _dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
     
     def _handle_validate_password(self):
         """处理密码验证请求"""
         try:
             # 直接调用通用密码验证方法
             if self._validate_request_password():
-                return json.dumps({'success': True, 'message': 'Password validated'}), 200, {'Content-Type': 'application/json'}
+                return _PASSWORD_VALIDATED_BODY, 200, {'Content-Type': 'application/json'}
             else:
-                return json.dumps({'success': False, 'message': 'Invalid password'}), 401, {'Content-Type': 'application/json'}
+                return _INVALID_PASSWORD_BODY, 401, {'Content-Type': 'application/json'}
         except Exception as e:
             logger.error(f"处理密码验证请求失败: {e}")
-            return json.dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
+            return _dumps({'error': str(e)}), 500, {'Content-Type': 'application/json'}
     
     def _handle_delete_static_page(self):
         """处理静态页面删除请求"""
         try:
             # 验证密码
             if not self._validate_request_password():
-                return json.dumps({'success': False, 'message': 'Invalid password'}), 401, {'Content-Type': 'application/json'}
+                return _INVALID_PASSWORD_BODY, 401, {'Content-Type': 'application/json'}
             
             # 获取请求参数
             filename = request.args.get('filename')
             
             if not filename:
-                return json.dumps({'success': False, 'error': '请提供文件名'}), 400, {'Content-Type': 'application/json'}
+                return _dumps({'success': False, 'error': '请提供文件名'}), 400, {'Content-Type': 'application/json'}
             
             # 检查是否有静态页面管理器
-            if not hasattr(self, 'static_page_manager') or not self.static_page_manager:
-                return json.dumps({'success': False, 'error': '静态页面管理器未初始化'}), 500, {'Content-Type': 'application/json'}
+            if not self.static_page_manager:
+                return _dumps({'success': False, 'error': '静态页面管理器未初始化'}), 500, {'Content-Type': 'application/json'}
             
             # 调用静态页面管理器删除页面
             success = self.static_page_manager.delete_page(filename)
             
             if success:
-                return json.dumps({'success': True, 'message': '文件删除成功'}), 200, {'Content-Type': 'application/json'}
+                return _dumps({'success': True, 'message': '文件删除成功'}), 200, {'Content-Type': 'application/json'}
             else:
-                return json.dumps({'success': False, 'error': '文件不存在或删除失败'}), 404, {'Content-Type': 'application/json'}
+                return _dumps({'success': False, 'error': '文件不存在或删除失败'}), 404, {'Content-Type': 'application/json'}
             
         except Exception as e:
             logger.error(f"处理静态页面删除请求失败: {e}")
-            return json.dumps({'success': False, 'error': str(e)}), 500, {'Content-Type': 'application/json'}
-    
-    def _clean_expired_cache(self):
-        """清理过期的缓存项"""
-        current_time = time.time()
-        expired_keys = [msg_id for msg_id, cache_item in self.wechat_msg_cache.items() 
-                      if cache_item['expire_time'] < current_time]
-        for msg_id in expired_keys:
-            del self.wechat_msg_cache[msg_id]
-    
-    def _get_cache_item(self, msg_id):
-        """获取缓存项，如果不存在或已过期返回None"""
-        self._clean_expired_cache()  # 先清理过期缓存
-        cache_item = self.wechat_msg_cache.get(msg_id)
-        if cache_item and cache_item['expire_time'] > time.time():
+            return _dumps({'success': False, 'error': str(e)}), 500, {'Content-Type': 'application/json'}
+    
+    def _clean_expired_cache(self, current_time: float):
+        """
+        清理过期的缓存项
+        
+        所有缓存项有效期相同且写入时都移到末尾，按顺序即按过期时间排列，
+        只需从头部弹出已过期的项，遇到未过期的项即可停止
+        """
+        cache = self.wechat_msg_cache
+        while cache and next(iter(cache.values()))['expire_time'] < current_time:
+            cache.popitem(last=False)
+    
+    def _get_cache_item(self, msg_id, current_time: Optional[float] = None):
+        """
+        获取缓存项，如果不存在或已过期返回None
+        
+        Args:
+            msg_id: 微信消息ID
+            current_time: 当前时间戳，调用方已获取时传入，避免重复取时间
+        """
+        if current_time is None:
+            current_time = time.time()
+        with self.wechat_msg_cache_lock:
+            self._clean_expired_cache(current_time)  # 先清理过期缓存
+            cache_item = self.wechat_msg_cache.get(msg_id)
+        if cache_item and cache_item['expire_time'] > current_time:
             return cache_item['content']
         return None
     
-    def _set_cache_item(self, msg_id, content):
-        """设置缓存项"""
-        # 先清理过期缓存
-        self._clean_expired_cache()
-        
-        # 如果缓存项已存在，先删除它（这样会将其移到字典末尾，相当于更新访问时间）
-        if msg_id in self.wechat_msg_cache:
-            del self.wechat_msg_cache[msg_id]
-        
-        # 检查缓存大小是否超过限制
-        if len(self.wechat_msg_cache) >= self.wechat_msg_ai_cache_size:
-            # 删除最早添加的缓存项（字典保持插入顺序）
-            oldest_msg_id = next(iter(self.wechat_msg_cache))
-            del self.wechat_msg_cache[oldest_msg_id]
-        
-        # 添加新的缓存项
-        expire_time = time.time() + self.wechat_msg_ai_cache_time
-        self.wechat_msg_cache[msg_id] = {
-            "content": content,
-            "expire_time": expire_time
-        }
+    def _set_cache_item(self, msg_id, content, current_time: Optional[float] = None):
+        """
+        设置缓存项
+        
+        Args:
+            msg_id: 微信消息ID
+            content: 回复内容
+            current_time: 当前时间戳，调用方已获取时传入，避免重复取时间
+        """
+        if current_time is None:
+            current_time = time.time()
+        with self.wechat_msg_cache_lock:
+            # 先清理过期缓存
+            self._clean_expired_cache(current_time)
+            
+            # 添加或更新缓存项，并移到末尾（最新写入、最晚过期）
+            self.wechat_msg_cache[msg_id] = {
+                "content": content,
+                "expire_time": current_time + self.wechat_msg_ai_cache_time
+            }
+            self.wechat_msg_cache.move_to_end(msg_id)
+            
+            # 超过大小限制时删除最早写入的缓存项
+            while len(self.wechat_msg_cache) > self.wechat_msg_ai_cache_size:
+                self.wechat_msg_cache.popitem(last=False)
     
     def _get_or_create_lock(self, msg_id):
-        """获取或创建消息锁"""
+        """获取或创建消息锁，并登记一个使用者，使用完毕后须调用_release_lock_ref"""
         with self.wechat_msg_locks_lock:
-            if msg_id not in self.wechat_msg_locks:
-                self.wechat_msg_locks[msg_id] = threading.Lock()
-            return self.wechat_msg_locks[msg_id]
+            entry = self.wechat_msg_locks.get(msg_id)
+            if entry is None:
+                entry = self.wechat_msg_locks[msg_id] = [threading.Lock(), 0]
+            entry[1] += 1
+            return entry[0]
     
-    def _build_wechat_response_xml(self, from_user: str, to_user: str, content: str) -> bytes:
+    def _release_lock_ref(self, msg_id):
+        """注销消息锁的一个使用者，没有使用者时移除该锁，锁表大小只取决于正在处理的消息数"""
+        with self.wechat_msg_locks_lock:
+            entry = self.wechat_msg_locks[msg_id]
+            entry[1] -= 1
+            if not entry[1]:
+                del self.wechat_msg_locks[msg_id]
+    
+    def _build_wechat_response_xml(self, from_user: str, to_user: str, content: str,
+                                   now: Optional[float] = None) -> bytes:
         """
         构建微信文本消息响应的XML格式
         
@@ -1195,19 +1894,23 @@ class StaticPageServer:
             from_user: 消息来源用户（微信用户的OpenID）
             to_user: 消息目标用户（公众号的原始ID）
             content: 回复内容
+            now: 当前时间戳，用作CreateTime；调用方已获取时传入，避免重复取时间
             
         Returns:
             格式化的XML响应字节数组（UTF-8编码）
         """
-        xml_str = f"""<?xml version="1.0" encoding="UTF-8"?>
-                    <xml>
-                        <ToUserName><![CDATA[{from_user}]]></ToUserName>
-                        <FromUserName><![CDATA[{to_user}]]></FromUserName>
-                        <CreateTime>{int(time.time())}</CreateTime>
-                        <MsgType><![CDATA[text]]></MsgType>
-                        <Content><![CDATA[{content}]]></Content>
-                    </xml>"""
-        return xml_str.encode('utf-8')
+        # 内容中出现"]]>"会提前结束CDATA段，拆分为两个CDATA段；先用in判断，绝大多数回复无需replace
+        if ']]>' in content:
+            content = content.replace(']]>', ']]]]><![CDATA[>')
+        
+        # 固定片段在模块加载时已拼好，这里只需一次join和一次编码
+        return ''.join((
+            _WECHAT_REPLY_PREFIX, from_user,
+            _WECHAT_REPLY_FROM, to_user,
+            _WECHAT_REPLY_TIME, str(int(now) if now is not None else time.time_ns() // 1_000_000_000),
+            _WECHAT_REPLY_CONTENT, content,
+            _WECHAT_REPLY_SUFFIX
+        )).encode('utf-8')
     
     def _handle_wechat_message(self):
         """处理微信消息，调用AI服务自动回复"""
@@ -1216,32 +1919,33 @@ class StaticPageServer:
             if not self._verify_wechat_signature():
                 return "Signature verification failed", 403
             
-            # 2. 解析微信发来的XML消息
-            xml_data = request.data.decode('utf-8')
+            # 2. 解析微信发来的XML消息，直接解析原始字节，无需先解码为字符串
+            root = _parse_xml(request.get_data())
             
-            # 解析XML
-            root = ET.fromstring(xml_data)
+            # 一次遍历收集所有字段
+            fields = {child.tag: child.text or '' for child in root}
             
             # 提取消息类型
-            msg_type = root.find('MsgType').text if root.find('MsgType') is not None else ''
+            msg_type = fields.get('MsgType', '')
             
             # 3. 只处理文本消息
             if msg_type == 'text':
                 # 提取消息内容和其他必要信息
-                to_user = root.find('ToUserName').text if root.find('ToUserName') is not None else ''
-                from_user = root.find('FromUserName').text if root.find('FromUserName') is not None else ''
-                create_time = root.find('CreateTime').text if root.find('CreateTime') is not None else ''
-                content = root.find('Content').text if root.find('Content') is not None else ''
-                msg_id = root.find('MsgId').text if root.find('MsgId') is not None else ''
+                to_user = fields.get('ToUserName', '')
+                from_user = fields.get('FromUserName', '')
+                create_time = fields.get('CreateTime', '')
+                content = fields.get('Content', '')
+                msg_id = fields.get('MsgId', '')
                 
-                logger.info(f"收到微信消息: 来自{from_user}, 内容: {content}, MsgId: {msg_id}")
+                logger.info("收到微信消息: 来自%s, 内容: %s, MsgId: %s", from_user, content, msg_id)
                 
-                # 4. 检查缓存
-                cached_response = self._get_cache_item(msg_id)
+                # 4. 检查缓存，缓存检查和响应CreateTime共用同一个时间戳
+                now = time.time()
+                cached_response = self._get_cache_item(msg_id, now)
                 if cached_response:
-                    logger.info(f"使用缓存的微信消息响应: MsgId={msg_id}")
+                    logger.info("使用缓存的微信消息响应: MsgId=%s", msg_id)
                     # 5. 生成微信响应XML
-                    response_xml = self._build_wechat_response_xml(from_user, to_user, cached_response)
+                    response_xml = self._build_wechat_response_xml(from_user, to_user, cached_response, now)
                     return response_xml, 200, {'Content-Type': 'application/xml; charset=utf-8'}
                 
                 # 5. 获取或创建消息锁
@@ -1249,62 +1953,56 @@ class StaticPageServer:
                 
                 # 6. 尝试获取锁，处理超时情况
                 if not msg_lock.acquire(timeout=self.wechat_msg_ai_timeout):
-                    logger.warning(f"获取微信消息锁超时: MsgId={msg_id}")
+                    logger.warning("获取微信消息锁超时: MsgId=%s", msg_id)
+                    self._release_lock_ref(msg_id)
                     # 锁超时，返回默认回复
                     default_response = "抱歉，当前请求量较大，请稍后再试"
                     # 缓存默认回复
-                    self._set_cache_item(msg_id, default_response)
-                    response_xml = self._build_wechat_response_xml(from_user, to_user, default_response)
+                    now = time.time()
+                    self._set_cache_item(msg_id, default_response, now)
+                    response_xml = self._build_wechat_response_xml(from_user, to_user, default_response, now)
                     return response_xml, 200, {'Content-Type': 'application/xml; charset=utf-8'}
                 
                 try:
                     # 再次检查缓存，防止在获取锁的过程中其他线程已经处理了该消息
-                    cached_response = self._get_cache_item(msg_id)
+                    now = time.time()
+                    cached_response = self._get_cache_item(msg_id, now)
                     if cached_response:
-                        logger.info(f"使用缓存的微信消息响应: MsgId={msg_id}")
-                        response_xml = self._build_wechat_response_xml(from_user, to_user, cached_response)
+                        logger.info("使用缓存的微信消息响应: MsgId=%s", msg_id)
+                        response_xml = self._build_wechat_response_xml(from_user, to_user, cached_response, now)
                         return response_xml, 200, {'Content-Type': 'application/xml; charset=utf-8'}
                     
                     # 7. 调用AI服务获取回复（使用公众号专用配置）
                     ai_service = get_ai_service(service_type="wechat")
                     
-                    # 确保每个线程都有自己的事件循环
-                    try:
-                        loop = asyncio.get_event_loop()
-                    except RuntimeError:
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                    # 从环境变量获取交互模式，优先使用微信专用配置，默认使用block模式
-                    interaction_mode = os.getenv('OPENAI_WECHAT_INTERACTION_MODE', 
-                                               os.getenv('OPENAI_INTERACTION_MODE', 'block')).strip().lower()
-                    # 验证交互模式
-                    if interaction_mode not in ['stream', 'block']:
-                        interaction_mode = 'block'  # 默认使用阻塞模式
-                    
                     # 根据交互模式调用不同的AI服务方法
-                    if interaction_mode == 'stream':
+                    if self.wechat_interaction_mode == 'stream':
                         # stream模式：使用stream_chat方法
                         def stream_wrapper():
                             async def collect_stream():
                                 collected = []
+                                # 已收集内容的累计长度，避免每个分片都拼接全部内容来计算长度
+                                total_len = 0
                                 try:
-                                    # 使用asyncio.wait_for设置超时
+                                    # 在当前任务内设置超时，不额外创建Task
                                     async def collect_with_timeout():
+                                        nonlocal total_len
                                         async for chunk in ai_service.stream_chat(
                                             user_message=content,
                                             conversation_history=[]  # 微信公众号暂时不支持上下文
                                         ):
                                             collected.append(chunk)
+                                            total_len += len(chunk)
                                             # 检查是否超过长度限制
-                                            if len(''.join(collected)) >= self.wechat_msg_ai_len_limit:
+                                            if total_len >= self.wechat_msg_ai_len_limit:
                                                 collected.append("..." + self.wechat_msg_ai_timeout_prompt)
                                                 break
                                     
-                                    await asyncio.wait_for(collect_with_timeout(), timeout=self.wechat_msg_ai_timeout)
+                                    await _await_with_timeout(collect_with_timeout(), self.wechat_msg_ai_timeout)
                                 except asyncio.TimeoutError:
-                                    logger.warning(f"微信消息AI响应超时: MsgId={msg_id}")
+                                    logger.warning("微信消息AI响应超时: MsgId=%s", msg_id)
                                     # 添加超时提示
-                                    if len(''.join(collected)) < self.wechat_msg_ai_len_limit:
+                                    if total_len < self.wechat_msg_ai_len_limit:
                                         collected.append(self.wechat_msg_ai_timeout_prompt)
                                 except Exception as e:
                                     logger.error(f"微信消息AI响应异常: {str(e)}")
@@ -1312,39 +2010,42 @@ class StaticPageServer:
                                 return ''.join(collected)
                             return collect_stream()
                         
-                        ai_reply = loop.run_until_complete(stream_wrapper())
+                        ai_reply = run_coroutine(stream_wrapper())
                     else:
                         # block模式：使用simple_chat方法
                         try:
-                            # 使用asyncio.wait_for设置超时
-                            ai_reply = loop.run_until_complete(asyncio.wait_for(
+                            # 在提交到后台事件循环的任务内设置超时，不额外创建Task
+                            ai_reply = run_coroutine(_await_with_timeout(
                                 ai_service.simple_chat(
                                     user_message=content,
                                     conversation_history=[]  # 微信公众号暂时不支持上下文
                                 ),
-                                timeout=self.wechat_msg_ai_timeout
+                                self.wechat_msg_ai_timeout
                             ))
                         except asyncio.TimeoutError:
-                            logger.warning(f"微信消息AI响应超时: MsgId={msg_id}")
+                            logger.warning("微信消息AI响应超时: MsgId=%s", msg_id)
                             ai_reply = "抱歉，当前AI服务响应超时，请稍后再试"
                         except Exception as e:
                             logger.error(f"微信消息AI响应异常: {e}")
                             ai_reply = f"抱歉，当前AI服务响应异常: {str(e)}"
                     
-                    # 8. 处理响应长度限制
-                    if len(ai_reply) > self.wechat_msg_ai_len_limit:
-                        ai_reply = ai_reply[:self.wechat_msg_ai_len_limit] + "..." + self.wechat_msg_ai_timeout_prompt
+                    # 8. 处理响应长度限制（单次构建结果字符串）
+                    len_limit = self.wechat_msg_ai_len_limit
+                    if len(ai_reply) > len_limit:
+                        ai_reply = f"{ai_reply[:len_limit]}...{self.wechat_msg_ai_timeout_prompt}"
                     
-                    # 9. 缓存响应
-                    self._set_cache_item(msg_id, ai_reply)
+                    # 9. 缓存响应，AI调用耗时较长，重新取一次时间，缓存过期时间和响应CreateTime共用
+                    now = time.time()
+                    self._set_cache_item(msg_id, ai_reply, now)
                     
                     # 10. 生成微信响应XML
-                    response_xml = self._build_wechat_response_xml(from_user, to_user, ai_reply)
+                    response_xml = self._build_wechat_response_xml(from_user, to_user, ai_reply, now)
                     
                     return response_xml, 200, {'Content-Type': 'application/xml; charset=utf-8'}
                 finally:
                     # 释放锁
                     msg_lock.release()
+                    self._release_lock_ref(msg_id)
             else:
                 # 非文本消息，返回空响应
                 return "success", 200, {'Content-Type': 'text/plain; charset=utf-8'}
@@ -1365,10 +2066,10 @@ class StaticPageServer:
             self.server_thread = threading.Thread(target=self._run_server, daemon=True)
             self.server_thread.start()
             
-            logger.info(f"Web 服务器启动成功")
-            logger.info(f"服务地址: http://{self.host}:{self.port}{self.context_path}/")
-            logger.info(f"静态网页目录: {self.pages_dir}")
-            logger.info(f"页面访问格式: http://{self.host}:{self.port}{self.context_path}/pages/文件名.html")
+            logger.info("Web 服务器启动成功")
+            logger.info("服务地址: http://%s:%s%s/", self.host, self.port, self.context_path)
+            logger.info("静态网页目录: %s", self.pages_dir)
+            logger.info("页面访问格式: http://%s:%s%s/pages/文件名.html", self.host, self.port, self.context_path)
             
             self.is_running = True
             return True
@@ -1381,26 +2082,40 @@ class StaticPageServer:
     def _run_server(self):
         """在独立线程中运行服务器"""
         try:
-            logger.info(f"Web服务器线程启动，监听地址 {self.host}，端口 {self.port}")
+            logger.info("Web服务器线程启动，监听地址 %s，端口 %s", self.host, self.port)
             
-            # 使用pywsgi WSGI服务器运行Flask应用
+            # gevent只有在socket被monkey patch后才能并发处理阻塞调用（AI接口、反向代理等），
+            # 否则一个慢请求会阻塞所有其他请求，此时改用多线程WSGI服务器
             try:
-                from gevent.pywsgi import WSGIServer
-                # 创建WSGI服务器实例
-                http_server = WSGIServer((self.host, self.port), self.app)
-                # 启动服务器
-                http_server.serve_forever()
+                from gevent import monkey
+                use_gevent = monkey.is_module_patched('socket')
             except ImportError:
-                # 如果pywsgi不可用，回退到Flask开发服务器
-                logger.warning("gevent.pywsgi未安装，回退到Flask开发服务器")
-                # 禁用Werkzeug的开发服务器警告
-                import logging
+                use_gevent = False
+            
+            if use_gevent:
+                # 使用pywsgi WSGI服务器运行Flask应用
+                from gevent.pool import Pool
+                from gevent.pywsgi import WSGIServer
+                # 创建WSGI服务器实例，与多线程模式一致关闭逐请求访问日志（默认逐条写入stderr），错误日志写入应用日志；
+                # 使用固定大小的greenlet池限制并发请求数
+                http_server = WSGIServer((self.host, self.port), self.app, spawn=Pool(self.gevent_pool_size),
+                                         log=None, error_log=logger)
+            else:
+                # 多线程WSGI服务器（ThreadingMixIn），每个连接一个守护线程，
+                # 默认开启SO_REUSEADDR，监听队列长度为128
+                from werkzeug.serving import make_server
+                # 禁用Werkzeug的逐请求访问日志
                 werkzeug_logger = logging.getLogger('werkzeug')
                 werkzeug_logger.setLevel(logging.ERROR)
-                # 设置模块日志级别为DEBUG，以便输出调试信息
-                logger.setLevel(logging.DEBUG)
-                # 启动Flask服务器
-                self.app.run(host=self.host, port=self.port, debug=False, use_reloader=False)
+                # 多线程模式下Werkzeug使用HTTP/1.1，无Content-Length的流式响应自动使用分块传输
+                http_server = make_server(self.host, self.port, self.app, threaded=True,
+                                          request_handler=NoDelayRequestHandler)
+            
+            # 开始监听前预渲染首页
+            self.regenerate_index()
+            
+            # 启动服务器
+            http_server.serve_forever()
         except Exception as e:
             logger.error(f"Web服务器运行异常: {e}")
         finally:
@@ -1464,12 +2179,18 @@ class IntegratedStaticPageServer(StaticPageServer):
         """
         super().__init__(pages_dir=pages_dir, port=port)
         self.static_page_manager = static_page_manager
+        # 静态网页列表渲染结果缓存：ETag -> UTF-8编码的HTML字节，页面列表或模板变化后ETag随之变化，旧条目按LRU淘汰
+        self._pages_list_html_cache = OrderedDict()
+        self._pages_list_html_cache_lock = threading.Lock()
+    
+    def _setup_routes(self):
+        """设置Flask路由，在基类路由表基础上增加静态网页列表页面"""
+        super()._setup_routes()
+        self._get_routes['/static-pages/'] = self._generate_static_pages_list
     
     def _generate_static_pages_list(self):
         """生成静态网页列表页面，包含页面头、分页显示和美化列表"""
         try:
-            from pathlib import Path
-            
             # 默认分页参数
             page_num = 1
             per_page = 10
@@ -1485,14 +2206,8 @@ class IntegratedStaticPageServer(StaticPageServer):
                     # 如果page参数不是有效数字，使用默认值
                     page_num = 1
             
-            # 获取页面列表
-            pages = []
-            if self.static_page_manager:
-                pages_info = self.static_page_manager.list_pages()
-                pages = pages_info.get('pages', [])
-            
-            # 按创建时间倒序排序，确保created_at始终为字符串，处理None值
-            pages.sort(key=lambda x: str(x.get('created_at', '')), reverse=True)
+            # 获取页面列表（已按创建时间倒序排列）
+            pages, pages_version = self._get_pages_snapshot()
             
             # 计算总页数
             total_pages = (len(pages) + per_page - 1) // per_page
@@ -1500,66 +2215,47 @@ class IntegratedStaticPageServer(StaticPageServer):
             # 确保page_num不超过总页数
             page_num = min(page_num, total_pages)
             
+            # 获取模板路径
+            template_path = _STATIC_PAGES_TEMPLATE
+            
+            # 页面内容由页面列表版本、页码和模板决定，据此生成ETag，客户端缓存有效时无需渲染直接返回304
+            etag_source = f"{self._etag_salt}:{pages_version}:{page_num}:{os.stat(template_path).st_mtime_ns}"
+            etag = hashlib.blake2b(etag_source.encode('utf-8'), digest_size=8).hexdigest()
+            if etag in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            
+            # 同一版本的列表页已渲染过时直接复用，无需重新生成分页和渲染模板
+            with self._pages_list_html_cache_lock:
+                html = self._pages_list_html_cache.get(etag)
+                if html is not None:
+                    self._pages_list_html_cache.move_to_end(etag)
+            if html is not None:
+                response = Response(html, content_type='text/html; charset=utf-8')
+                response.set_etag(etag)
+                response.cache_control.no_cache = True
+                return response
+            
             # 获取当前页的数据
             start = (page_num - 1) * per_page
             end = start + per_page
             current_pages = pages[start:end]
             
-            # 格式化文件大小的辅助函数
-            def format_file_size(size_bytes):
-                if size_bytes == 0:
-                    return "0 B"
-                units = ['B', 'KB', 'MB', 'GB']
-                unit_index = 0
-                size = float(size_bytes)
-                
-                while size >= 1024 and unit_index < len(units) - 1:
-                    size /= 1024
-                    unit_index += 1
-                
-                return f"{size:.2f} {units[unit_index]}"
-            
-            # 计算总文件大小 - 使用 current_size 优先，如果为0则使用 file_size，确保数值类型
-            total_file_size = 0
-            for page in pages:
-                file_size_val = page.get('current_size', page.get('file_size', 0))
-                # 确保file_size_val是数字
-                if isinstance(file_size_val, (int, float)):
-                    total_file_size += file_size_val
-                else:
-                    try:
-                        # 尝试转换为数字
-                        total_file_size += float(file_size_val)
-                    except (ValueError, TypeError):
-                        # 无法转换，跳过此文件的大小
-                        pass
-            total_size_formatted = format_file_size(total_file_size)
-            
-            # 格式化每个页面的文件大小 - 使用 current_size 优先，如果为0则使用 file_size
-            for page_item in current_pages:
-                file_size = page_item.get('current_size', page_item.get('file_size', 0))
-                # 确保file_size是数字
-                if isinstance(file_size, (int, float)):
-                    pass  # 已经是数字，直接使用
-                else:
-                    try:
-                        # 尝试转换为数字
-                        file_size = float(file_size)
-                    except (ValueError, TypeError):
-                        # 无法转换，使用0
-                        file_size = 0
-                page_item['file_size_formatted'] = format_file_size(file_size)
-            
-            # 生成分页HTML
+            # 计算总文件大小，每个页面的file_size_formatted已在页面列表缓存中预先计算
+            total_size_formatted = _format_file_size(sum(_get_page_size(page) for page in pages))
+            
+            # 生成分页HTML：先收集片段，最后一次性拼接
             pagination_html = ""
             if total_pages > 1:
-                pagination_html = "<div class='pagination'>"
+                list_url = self.static_pages_url
+                parts = ["<div class='pagination'>"]
                 
                 # 上一页
                 if page_num > 1:
-                    pagination_html += f"<a href='{self.context_path}/static-pages/?page={page_num-1}' class='page-btn prev'>上一页</a>"
+                    parts.append(_PAGE_LINK_TMPL.format(url=list_url, page=page_num - 1, cls=' prev', label='上一页'))
                 else:
-                    pagination_html += "<span class='page-btn prev disabled'>上一页</span>"
+                    parts.append(_PAGE_SPAN_TMPL.format(cls=' prev disabled', label='上一页'))
                 
                 # 页码按钮 - 只显示前后3页（共7页）
                 max_visible = 7  # 前后3页 + 当前页 = 7页
@@ -1568,52 +2264,34 @@ class IntegratedStaticPageServer(StaticPageServer):
                 
                 # 如果起始页大于1，显示第一页和省略号
                 if start_page > 1:
-                    pagination_html += f"<a href='{self.context_path}/static-pages/?page=1' class='page-btn'>1</a>"
+                    parts.append(_PAGE_LINK_TMPL.format(url=list_url, page=1, cls='', label=1))
                     if start_page > 2:
-                        pagination_html += "<span class='page-btn ellipsis'>...</span>"
+                        parts.append(_PAGE_SPAN_TMPL.format(cls=' ellipsis', label='...'))
                 
-                # 显示当前页前后5页
+                # 显示当前页前后3页
                 for i in range(start_page, end_page + 1):
                     if i == page_num:
-                        pagination_html += f"<span class='page-btn current'>{i}</span>"
+                        parts.append(_PAGE_SPAN_TMPL.format(cls=' current', label=i))
                     else:
-                        pagination_html += f"<a href='{self.context_path}/static-pages/?page={i}' class='page-btn'>{i}</a>"
+                        parts.append(_PAGE_LINK_TMPL.format(url=list_url, page=i, cls='', label=i))
                 
                 # 如果结束页小于总页数，显示省略号和最后一页
                 if end_page < total_pages:
                     if end_page < total_pages - 1:
-                        pagination_html += "<span class='page-btn ellipsis'>...</span>"
-                    pagination_html += f"<a href='{self.context_path}/static-pages/?page={total_pages}' class='page-btn'>{total_pages}</a>"
+                        parts.append(_PAGE_SPAN_TMPL.format(cls=' ellipsis', label='...'))
+                    parts.append(_PAGE_LINK_TMPL.format(url=list_url, page=total_pages, cls='', label=total_pages))
                 
                 # 下一页
                 if page_num < total_pages:
-                    pagination_html += f"<a href='{self.context_path}/static-pages/?page={page_num+1}' class='page-btn next'>下一页</a>"
+                    parts.append(_PAGE_LINK_TMPL.format(url=list_url, page=page_num + 1, cls=' next', label='下一页'))
                 else:
-                    pagination_html += "<span class='page-btn next disabled'>下一页</span>"
+                    parts.append(_PAGE_SPAN_TMPL.format(cls=' next disabled', label='下一页'))
                 
                 # 跳转输入框
-                pagination_html += f"""
-                <div class='page-jump'>
-                    <input type='number' id='jumpPage' min='1' max='{total_pages}' placeholder='页码' class='jump-input' />
-                    <button onclick="jumpToPage({total_pages})" class='jump-btn'>跳转</button>
-                </div>
-                <script>
-                    function jumpToPage(totalPages) {{
-                        var pageNum = document.getElementById('jumpPage').value;
-                        pageNum = parseInt(pageNum);
-                        if (pageNum >= 1 && pageNum <= totalPages) {{
-                            window.location.href = '{self.context_path}/static-pages/?page=' + pageNum;
-                        }} else {{
-                            alert('请输入有效的页码 (1-' + totalPages + ')');
-                        }}
-                    }}
-                </script>
-                """
+                parts.append(_PAGE_JUMP_TMPL.format(url=list_url, total_pages=total_pages))
                 
-                pagination_html += "</div>"
-            
-            # 获取模板路径
-            template_path = Path(__file__).parent.parent.parent / "templates" / "static_pages_template.html"
+                parts.append("</div>")
+                pagination_html = "".join(parts)
             
             # 准备模板变量，确保所有变量都有值
             template_vars = {
@@ -1623,100 +2301,116 @@ class IntegratedStaticPageServer(StaticPageServer):
                 'pages_info': current_pages,
                 'pagination_html': pagination_html
             }
-            logger.debug(f"静态网页列表模板变量: {template_vars}")
+            logger.debug("静态网页列表模板变量: %s", template_vars)
             
-            # 使用模板渲染
-            html = my_render_template(str(template_path), template_vars)
+            # 使用模板渲染，缓存编码后的字节，命中缓存时无需再次编码
+            html = my_render_template(template_path, template_vars).encode('utf-8')
+            with self._pages_list_html_cache_lock:
+                self._pages_list_html_cache[etag] = html
+                while len(self._pages_list_html_cache) > PAGES_LIST_HTML_CACHE_SIZE:
+                    self._pages_list_html_cache.popitem(last=False)
             
-            return html, 200, {'Content-Type': 'text/html; charset=utf-8'}
+            response = Response(html, content_type='text/html; charset=utf-8')
+            response.set_etag(etag)
+            # 要求浏览器每次使用前携带ETag重新验证
+            response.cache_control.no_cache = True
+            return response
             
         except Exception as e:
             logger.error(f"生成静态网页列表页面失败: {e}")
             return "<h1>错误</h1><p>无法加载静态网页列表</p>", 500
+    
+    def _get_index_cache_key(self) -> tuple:
+        """
+        获取首页缓存键：集成版本首页还展示存储统计信息，在模板修改时间之外加上存储数据文件的修改时间
+        
+        Returns:
+            由各依赖文件st_mtime_ns组成的元组，文件不存在时对应位置为None
+        """
+        return super()._get_index_cache_key() + (self._get_storage_db_mtime(),)
             
-    def _generate_index_page(self):
-        """生成索引页面 - 集成版本"""
-        try:
-            # 使用静态页面管理器获取存储统计信息
-            stats = {
-                'total_files': 0,
-                'total_size': '0 B',
-                'earliest_created': None,
-                'latest_created': None
-            }
-            
-            if self.static_page_manager:
-                # 尝试使用静态页面管理器的统计信息方法
-                try:
-                    stats = self.static_page_manager.get_storage_stats()
-                except AttributeError:
-                    # 回退方案：如果没有get_storage_stats方法，手动计算
-                    pages_info = self.static_page_manager.list_pages()
-                    pages = pages_info.get('pages', [])
-                    stats = {
-                        'total_files': len(pages),
-                        'total_size': sum(page.get('current_size', 0) for page in pages),
-                        'earliest_created': None,
-                        'latest_created': None
-                    }
-                    
-                    if pages:
-                        created_times = [page.get('created_at', '') for page in pages if page.get('created_at')]
-                        created_times.sort()
-                        if created_times:
-                            stats['earliest_created'] = created_times[0]
-                            stats['latest_created'] = created_times[-1]
-                        
-                    # 格式化文件大小
-                    def format_file_size(size_bytes):
-                        if size_bytes == 0:
-                            return "0 B"
-                        units = ['B', 'KB', 'MB', 'GB']
-                        unit_index = 0
-                        size = float(size_bytes)
-                        
-                        while size >= 1024 and unit_index < len(units) - 1:
-                            size /= 1024
-                            unit_index += 1
-                        
-                        return f"{size:.2f} {units[unit_index]}"
-                    
-                    stats['total_size'] = format_file_size(stats['total_size'])
-            
-            # 获取模板路径
-            template_path = Path(__file__).parent.parent.parent / "templates" / "index_template.html"
-            
-            # 准备模板变量，处理默认值
-            template_vars = {
-                'title': '静态网页服务',
-                'subtitle': '生成和管理静态HTML网页的HTTP访问服务',
-                'pages_url': f'{self.context_path}/static-pages/',
-                'chat_url': f'{self.context_path}/chat/',
-                'total_files': stats['total_files'] if stats['total_files'] is not None else '无',
-                'total_size': stats['total_size'] if stats['total_size'] is not None else '无',
-                'earliest_created': stats['earliest_created'] if stats['earliest_created'] is not None else '无',
-                'latest_created': stats['latest_created'] if stats['latest_created'] is not None else '无'
-            }
-            
-            # 使用模板渲染 - 传递字典参数
-            html = my_render_template(str(template_path), template_vars)
-            
-            return html, 200, {'Content-Type': 'text/html; charset=utf-8'}
-            
-        except Exception as e:
-            logger.error(f"生成索引页面失败: {e}")
-            return "<h1>错误</h1><p>无法加载页面列表</p>", 500
+    def _render_index_page(self) -> str:
+        """
+        渲染索引页面 - 集成版本
+        
+        Returns:
+            渲染后的HTML字符串
+        """
+        # 使用静态页面管理器获取存储统计信息
+        stats = {
+            'total_files': 0,
+            'total_size': '0 B',
+            'earliest_created': None,
+            'latest_created': None
+        }
+        
+        if self.static_page_manager:
+            # 尝试使用静态页面管理器的统计信息方法
+            try:
+                stats = self.static_page_manager.get_storage_stats()
+            except AttributeError:
+                # 回退方案：如果没有get_storage_stats方法，手动计算
+                pages_info = self.static_page_manager.list_pages()
+                pages = pages_info.get('pages', [])
+                stats = {
+                    'total_files': len(pages),
+                    'total_size': sum(page.get('current_size', 0) for page in pages),
+                    'earliest_created': None,
+                    'latest_created': None
+                }
+                
+                if pages:
+                    created_times = [page.get('created_at', '') for page in pages if page.get('created_at')]
+                    created_times.sort()
+                    if created_times:
+                        stats['earliest_created'] = created_times[0]
+                        stats['latest_created'] = created_times[-1]
+                
+                stats['total_size'] = _format_file_size(stats['total_size'])
+        
+        # 获取模板路径
+        template_path = _INDEX_TEMPLATE
+        
+        # 准备模板变量，处理默认值
+        template_vars = {
+            'title': '静态网页服务',
+            'subtitle': '生成和管理静态HTML网页的HTTP访问服务',
+            'pages_url': self.static_pages_url,
+            'chat_url': self.chat_url,
+            'total_files': stats['total_files'] if stats['total_files'] is not None else '无',
+            'total_size': stats['total_size'] if stats['total_size'] is not None else '无',
+            'earliest_created': stats['earliest_created'] if stats['earliest_created'] is not None else '无',
+            'latest_created': stats['latest_created'] if stats['latest_created'] is not None else '无'
+        }
+        
+        # 使用模板渲染 - 传递字典参数
+        return my_render_template(template_path, template_vars)
 
 
 # 全局Web服务器实例
 _static_page_server = None
+# 保护全局Web服务器实例创建和替换的锁
+_static_page_server_lock = threading.Lock()
 
 
 def get_static_page_server() -> StaticPageServer:
     """获取全局Web服务器实例"""
     global _static_page_server
+    # 双重检查加锁，避免并发调用重复创建实例
     if _static_page_server is None:
-        _static_page_server = StaticPageServer()
+        with _static_page_server_lock:
+            if _static_page_server is None:
+                _static_page_server = StaticPageServer()
+    return _static_page_server
+
+
+def get_existing_static_page_server() -> Optional[StaticPageServer]:
+    """
+    获取已创建的全局Web服务器实例，不存在时返回None，不会新建实例
+    
+    Returns:
+        Web服务器实例或None
+    """
     return _static_page_server
 
 
@@ -1739,8 +2433,38 @@ def start_static_page_server(port: int = 3004, static_page_manager=None) -> bool
         pages_dir = str(static_page_manager.storage_dir)
     
     # 使用集成版本的服务器以支持聊天和微信功能
-    _static_page_server = IntegratedStaticPageServer(pages_dir=pages_dir, port=port, static_page_manager=static_page_manager)
-    return _static_page_server.start()
+    with _static_page_server_lock:
+        _static_page_server = IntegratedStaticPageServer(pages_dir=pages_dir, port=port, static_page_manager=static_page_manager)
+        server = _static_page_server
+    return server.start()
+
+
+def create_wsgi_app(static_page_manager=None):
+    """
+    创建供外部WSGI服务器（如gunicorn）加载的Flask应用，不启动内置服务器线程
+    
+    应用内的微信消息去重、AI回复和页面缓存均为进程内状态，
+    应使用单进程多线程运行，例如: gunicorn -w 1 -k gthread --threads 32 wsgi:app
+    
+    Args:
+        static_page_manager: 静态页面管理器实例
+        
+    Returns:
+        Flask应用实例
+    """
+    global _static_page_server
+    
+    pages_dir = "data/static_pages"
+    if static_page_manager and hasattr(static_page_manager, 'storage_dir'):
+        pages_dir = str(static_page_manager.storage_dir)
+    
+    with _static_page_server_lock:
+        _static_page_server = IntegratedStaticPageServer(pages_dir=pages_dir, static_page_manager=static_page_manager)
+        server = _static_page_server
+    # 由外部服务器负责监听，这里只标记为运行中并预渲染首页
+    server.is_running = True
+    server.regenerate_index()
+    return server.app
 
 
 def get_static_page_url(filename: str) -> Optional[str]:
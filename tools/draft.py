@@ -24,6 +24,15 @@ MAX_LIST_IMAGE_DISPLAY_COUNT = 3
 COUNT_MIN = 1
 COUNT_MAX = 20
 
+# HTML清理用正则表达式，模块加载时预编译
+_DOCTYPE_RE = re.compile(r'<!DOCTYPE[^>]*>', re.IGNORECASE)
+_BODY_RE = re.compile(r'<body[^>]*>(.*?)</body>', re.DOTALL | re.IGNORECASE)
+_SCRIPT_RE = re.compile(r'<script[^>]*>.*?</script>', re.DOTALL | re.IGNORECASE)
+_STYLE_RE = re.compile(r'<style[^>]*>.*?</style>', re.DOTALL | re.IGNORECASE)
+_HTML_OPEN_RE = re.compile(r'<html[^>]*>', re.IGNORECASE)
+_HTML_CLOSE_RE = re.compile(r'</html>', re.IGNORECASE)
+_HEAD_RE = re.compile(r'<head[^>]*>.*?</head>', re.DOTALL | re.IGNORECASE)
+
 
 def clean_html_content(content: str) -> str:
     """
@@ -41,24 +50,24 @@ def clean_html_content(content: str) -> str:
         return content
     
     # 移除DOCTYPE声明
-    content = re.sub(r'<!DOCTYPE[^>]*>', '', content, flags=re.IGNORECASE)
+    content = _DOCTYPE_RE.sub('', content)
     
     # 尝试提取body内的内容
-    body_match = re.search(r'<body[^>]*>(.*?)</body>', content, re.DOTALL | re.IGNORECASE)
+    body_match = _BODY_RE.search(content)
     if body_match:
         # 提取body标签内的内容
         body_content = body_match.group(1)
         # 移除script和style标签及其内容（微信公众号不支持）
-        body_content = re.sub(r'<script[^>]*>.*?</script>', '', body_content, flags=re.DOTALL | re.IGNORECASE)
-        body_content = re.sub(r'<style[^>]*>.*?</style>', '', body_content, flags=re.DOTALL | re.IGNORECASE)
+        body_content = _SCRIPT_RE.sub('', body_content)
+        body_content = _STYLE_RE.sub('', body_content)
         return body_content.strip()
     
     # 如果没有body标签，尝试移除html和head标签
-    content = re.sub(r'<html[^>]*>', '', content, flags=re.IGNORECASE)
-    content = re.sub(r'</html>', '', content, flags=re.IGNORECASE)
-    content = re.sub(r'<head[^>]*>.*?</head>', '', content, flags=re.DOTALL | re.IGNORECASE)
-    content = re.sub(r'<script[^>]*>.*?</script>', '', content, flags=re.DOTALL | re.IGNORECASE)
-    content = re.sub(r'<style[^>]*>.*?</style>', '', content, flags=re.DOTALL | re.IGNORECASE)
+    content = _HTML_OPEN_RE.sub('', content)
+    content = _HTML_CLOSE_RE.sub('', content)
+    content = _HEAD_RE.sub('', content)
+    content = _SCRIPT_RE.sub('', content)
+    content = _STYLE_RE.sub('', content)
     
     return content.strip()
 
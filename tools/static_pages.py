@@ -3,8 +3,11 @@
 """
 import os
 import json
+import gzip
 import logging
+import re
 import uuid
+from operator import itemgetter
 from pathlib import Path
 from typing import Dict, Any, Optional
 from datetime import datetime
@@ -12,12 +15,20 @@ from datetime import datetime
 # 导入Web服务器
 # 导入Web服务器和存储管理器
 try:
-    from shared.utils.web_server import get_static_page_server, start_static_page_server
+    from shared.utils.web_server import get_static_page_server, get_existing_static_page_server, start_static_page_server
 except ImportError:
     def get_static_page_server():
         return None
+    
+    def get_existing_static_page_server():
+        return None
 
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 from shared.storage.storage_manager import StorageManager
 
 # 导入微信消息处理和AI服务
@@ -32,6 +43,12 @@ except ImportError as e:
 
 logger = logging.getLogger(__name__)
 
+# 自定义文件名只允许字母、数字、下划线和连字符
+_FILENAME_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
+
+# 页面列表排序键，itemgetter在C层取值，无需每个元素调用一次Python函数
+_CREATED_AT_KEY = itemgetter('created_at')
+
 
 def _generate_random_filename() -> str:
     """
@@ -45,6 +62,38 @@ def _generate_random_filename() -> str:
     return f"{unique_id}.html"
 
 
+def _write_precompressed_variants(file_path: Path, content: bytes):
+    """
+    在HTML文件旁写入预压缩版本（.gz，安装brotli时额外写入.br），
+    供Web服务器按Accept-Encoding直接发送，请求时无需再压缩
+    
+    Args:
+        file_path: HTML文件路径
+        content: HTML文件的UTF-8字节内容
+    """
+    try:
+        with open(f"{file_path}.gz", 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(f"{file_path}.br", 'wb') as f:
+                f.write(brotli.compress(content))
+    except Exception as e:
+        logger.warning(f"写入预压缩文件失败 {file_path}: {e}")
+
+
+def _remove_precompressed_variants(file_path: Path):
+    """
+    删除HTML文件对应的预压缩版本
+    
+    Args:
+        file_path: HTML文件路径
+    """
+    for suffix in ('.gz', '.br'):
+        variant_path = Path(f"{file_path}{suffix}")
+        if variant_path.exists():
+            variant_path.unlink()
+
+
 def _validate_html_content(html_content: str) -> bool:
     """
     验证HTML内容是否有效
@@ -128,8 +177,7 @@ class StaticPageManager:
             filename = filename[:-5]
         
         # 检查文件名是否只包含字母、数字、下划线和连字符
-        import re
-        if not re.match(r'^[a-zA-Z0-9_-]+$', filename):
+        if not _FILENAME_RE.match(filename):
             return None
         
         # 检查长度
@@ -239,6 +287,9 @@ class StaticPageManager:
                 with open(file_path, 'w', encoding='utf-8') as f:
                     f.write(html_content)
                 
+                # 写入预压缩版本
+                _write_precompressed_variants(file_path, html_content.encode('utf-8'))
+                
                 # 获取文件大小
                 file_size = file_path.stat().st_size
                 
@@ -259,11 +310,13 @@ class StaticPageManager:
             # 保存到存储管理器
             self.storage_manager.save_static_page(page_info)
             
-            # 获取Web服务器URL
+            # 获取Web服务器URL，并增量更新服务器的页面列表；服务器尚未创建时无需通知，也不为此新建实例
             page_url = None
-            http_server = get_static_page_server()
-            if http_server and http_server.is_running:
-                page_url = http_server.get_page_url(filename)
+            http_server = get_existing_static_page_server()
+            if http_server:
+                http_server.add_page(page_info)
+                if http_server.is_running:
+                    page_url = http_server.get_page_url(filename)
             
             result = {
                 'success': True,
@@ -274,7 +327,7 @@ class StaticPageManager:
                 'page_url': page_url
             }
             
-            logger.info(f"生成静态网页成功: {filename}")
+            logger.info("生成静态网页成功: %s", filename)
             return result
             
         except Exception as e:
@@ -333,6 +386,7 @@ class StaticPageManager:
             file_path = Path(page_info["filepath"])
             if file_path.exists():
                 file_path.unlink()
+            _remove_precompressed_variants(file_path)
             
             # 从本地元数据中删除
             if filename in self.metadata:
@@ -342,7 +396,12 @@ class StaticPageManager:
             # 从存储管理器中删除
             self.storage_manager.delete_static_page(filename)
             
-            logger.info(f"删除静态网页: {filename}")
+            # 增量更新服务器的页面列表；服务器尚未创建时无需通知，也不为此新建实例
+            http_server = get_existing_static_page_server()
+            if http_server:
+                http_server.remove_page(filename)
+            
+            logger.info("删除静态网页: %s", filename)
             return True
             
         except Exception as e:
@@ -367,6 +426,9 @@ class StaticPageManager:
             if not filename:
                 continue
             
+            # 存储管理器返回的是其内存数据中的对象，复制后再补充文件状态，避免写回存储数据
+            page_info = dict(page_info)
+            page_info.setdefault('created_at', '')
             file_path = self.storage_dir / filename
             
             if file_path.exists():
@@ -378,7 +440,8 @@ class StaticPageManager:
             pages.append(page_info)
         
         # 按创建时间排序
-        pages.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        if len(pages) > 1:
+            pages.sort(key=_CREATED_AT_KEY, reverse=True)
         
         return {
                 "success": True,
@@ -443,10 +506,10 @@ class StaticPageManager:
             
             success = self.integrated_server.start()
             if success:
-                logger.info(f"集成Web服务器启动成功，端口: {port}")
-                logger.info(f"静态页面访问: http://localhost:{port}/pages/")
-                logger.info(f"微信服务器验证: http://localhost:{port}/wechat/verify")
-                logger.info(f"聊天界面: http://localhost:{port}/chat/")
+                logger.info("集成Web服务器启动成功，端口: %s", port)
+                logger.info("静态页面访问: http://localhost:%s/pages/", port)
+                logger.info("微信服务器验证: http://localhost:%s/wechat/verify", port)
+                logger.info("聊天界面: http://localhost:%s/chat/", port)
             
             return success
             
@@ -3,6 +3,7 @@
 处理微信公众号的服务器验证、消息接收和回复等功能
 """
 import hashlib
+import hmac
 import xml.etree.ElementTree as ET
 import logging
 import os
@@ -10,10 +11,10 @@ import json
 from datetime import datetime
 from typing import Dict, Any, Optional
 from urllib.parse import parse_qs
-import asyncio
 import httpx
 
 from shared.storage.storage_manager import StorageManager
+from shared.utils.event_loop import run_coroutine
 
 logger = logging.getLogger(__name__)
 
@@ -67,8 +68,8 @@ class WechatMessageHandler:
             # 2. 对拼接后的字符串进行SHA1加密
             signature_compare = hashlib.sha1(sorted_params.encode('utf-8')).hexdigest()
             
-            # 3. 加密后的字符串与signature对比，匹配则验证成功
-            if signature == signature_compare:
+            # 3. 加密后的字符串与signature进行常量时间对比，匹配则验证成功
+            if hmac.compare_digest(signature_compare.encode('ascii'), signature.encode('utf-8')):
                 logger.info(f"微信服务器验证成功: {echostr}")
                 return {'success': True, 'echostr': echostr}
             else:
@@ -233,7 +234,7 @@ class WechatMessageHandler:
                 'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
             
-            # 保存到存储管理器
+            # 保存到存储管理器（同步写入，随后查询历史记录时即可读到该消息）
             self.storage_manager.save_wechat_message(message_info)
             
         except Exception as e:
@@ -300,14 +301,9 @@ def handle_wechat_tool(arguments: dict, wechat_handler: WechatMessageHandler) ->
             if not xml_data:
                 return "错误: 请提供XML消息数据"
             
-            # 使用asyncio运行异步处理
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                reply = loop.run_until_complete(wechat_handler.process_message(xml_data))
-                return f"消息处理成功\n回复内容:\n{reply}"
-            finally:
-                loop.close()
+            # 在后台事件循环中运行异步处理
+            reply = run_coroutine(wechat_handler.process_message(xml_data))
+            return f"消息处理成功\n回复内容:\n{reply}"
         
         elif action == 'get_history':
             limit = arguments.get('limit', 50)
@@ -331,14 +327,9 @@ def handle_wechat_tool(arguments: dict, wechat_handler: WechatMessageHandler) ->
         elif action == 'test_ai':
             message = arguments.get('message', '你好')
             
-            # 使用asyncio运行异步处理
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                ai_reply = loop.run_until_complete(wechat_handler.get_ai_reply(message))
-                return f"用户消息: {message}\nAI回复: {ai_reply}"
-            finally:
-                loop.close()
+            # 在后台事件循环中运行异步处理
+            ai_reply = run_coroutine(wechat_handler.get_ai_reply(message))
+            return f"用户消息: {message}\nAI回复: {ai_reply}"
         
         elif action == 'config_status':
             # 使用全局AI服务实例获取配置状态
@@ -0,0 +1,24 @@
+"""
+微信消息服务器WSGI入口，供gunicorn等生产级WSGI服务器加载
+
+示例: gunicorn -w 1 -k gthread --threads 32 -b 0.0.0.0:3004 wsgi:app
+"""
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+_BASE_DIR = Path(__file__).parent
+
+# 加载环境变量
+_env_file = _BASE_DIR / '.env'
+if _env_file.exists():
+    load_dotenv(_env_file)
+
+from shared.utils.web_server import create_wsgi_app
+from tools.static_pages import StaticPageManager
+
+# 与main.py一致的数据目录
+app = create_wsgi_app(static_page_manager=StaticPageManager(
+    storage_dir=str(_BASE_DIR / 'data' / 'static_pages'),
+    db_file=str(_BASE_DIR / 'data' / 'storage.db'),
+))